@@ -0,0 +1,216 @@
+import json, random, sqlite3, shutil, struct
+from pathlib import Path
+
+# Synthetic browser profiles for benchmarking, laid out as a mounted evidence
+# root (home/bench/...) so the normal discovery code finds them. Schemas carry
+# the columns the extractors read; contents are deterministic for a seed.
+
+WEBKIT_BASE = 13300000000000000   # 2022-06 in microseconds since 1601
+UNIX_BASE = 1650000000000000      # 2022-04 in microseconds since 1970
+HOSTS = 1000
+BATCH = 50000
+
+CHROME_HISTORY = """
+CREATE TABLE urls(id INTEGER PRIMARY KEY AUTOINCREMENT, url LONGVARCHAR, title LONGVARCHAR, visit_count INTEGER DEFAULT 0 NOT NULL,
+                  typed_count INTEGER DEFAULT 0 NOT NULL, last_visit_time INTEGER NOT NULL, hidden INTEGER DEFAULT 0 NOT NULL);
+CREATE TABLE visits(id INTEGER PRIMARY KEY AUTOINCREMENT, url INTEGER NOT NULL, visit_time INTEGER NOT NULL, from_visit INTEGER,
+                    transition INTEGER DEFAULT 0 NOT NULL, segment_id INTEGER, visit_duration INTEGER DEFAULT 0 NOT NULL);
+CREATE INDEX visits_url_index ON visits (url);
+CREATE INDEX visits_time_index ON visits (visit_time);
+CREATE TABLE keyword_search_terms (keyword_id INTEGER NOT NULL, url_id INTEGER NOT NULL, term LONGVARCHAR NOT NULL,
+                                   normalized_term LONGVARCHAR NOT NULL);
+CREATE TABLE downloads (id INTEGER PRIMARY KEY, guid VARCHAR NOT NULL, current_path LONGVARCHAR NOT NULL,
+                        target_path LONGVARCHAR NOT NULL, start_time INTEGER NOT NULL, tab_url VARCHAR NOT NULL);
+CREATE TABLE downloads_url_chains (id INTEGER NOT NULL, chain_index INTEGER NOT NULL, url LONGVARCHAR NOT NULL,
+                                   PRIMARY KEY (id, chain_index));
+"""
+CHROME_COOKIES = """
+CREATE TABLE cookies(creation_utc INTEGER NOT NULL, host_key TEXT NOT NULL, top_frame_site_key TEXT NOT NULL, name TEXT NOT NULL,
+                     value TEXT NOT NULL, encrypted_value BLOB NOT NULL, path TEXT NOT NULL, expires_utc INTEGER NOT NULL,
+                     is_secure INTEGER NOT NULL, is_httponly INTEGER NOT NULL, last_access_utc INTEGER NOT NULL);
+"""
+FIREFOX_PLACES = """
+CREATE TABLE moz_places (id INTEGER PRIMARY KEY, url LONGVARCHAR, title LONGVARCHAR, rev_host LONGVARCHAR, visit_count INTEGER DEFAULT 0,
+                         hidden INTEGER DEFAULT 0 NOT NULL, typed INTEGER DEFAULT 0 NOT NULL, frecency INTEGER DEFAULT -1 NOT NULL,
+                         last_visit_date INTEGER, guid TEXT, foreign_count INTEGER DEFAULT 0 NOT NULL, url_hash INTEGER DEFAULT 0 NOT NULL);
+CREATE TABLE moz_historyvisits (id INTEGER PRIMARY KEY, from_visit INTEGER, place_id INTEGER, visit_date INTEGER,
+                                visit_type INTEGER, session INTEGER);
+CREATE INDEX moz_historyvisits_dateindex ON moz_historyvisits (visit_date);
+CREATE INDEX moz_historyvisits_placedateindex ON moz_historyvisits (place_id, visit_date);
+"""
+FIREFOX_COOKIES = """
+CREATE TABLE moz_cookies (id INTEGER PRIMARY KEY, originAttributes TEXT NOT NULL DEFAULT '', name TEXT, value TEXT, host TEXT,
+                          path TEXT, expiry INTEGER, lastAccessed INTEGER, creationTime INTEGER);
+"""
+FIREFOX_FORMHISTORY = """
+CREATE TABLE moz_formhistory (id INTEGER PRIMARY KEY, fieldname TEXT NOT NULL, value TEXT NOT NULL, timesUsed INTEGER,
+                              firstUsed INTEGER, lastUsed INTEGER, guid TEXT);
+"""
+
+def _db(path, schema):
+    con = sqlite3.connect(path, isolation_level=None)
+    con.execute("PRAGMA journal_mode=OFF")
+    con.execute("PRAGMA synchronous=OFF")
+    con.executescript(schema)
+    con.execute("BEGIN")
+    return con
+
+def _load(con, sql, rows):
+    batch = []
+    for r in rows:
+        batch.append(r)
+        if len(batch) >= BATCH:
+            con.executemany(sql, batch)
+            batch = []
+    if batch:
+        con.executemany(sql, batch)
+
+def _close(con):
+    con.execute("COMMIT")
+    con.close()
+
+def _urls(rng, n, base, step):
+    """(id, url, title, visit_count, time) with times increasing in random steps."""
+    t = base
+    for i in range(1, n + 1):
+        t += rng.randrange(step)
+        host = f"site{rng.randrange(HOSTS)}.example.com"
+        yield i, f"https://{host}/page/{i}?q={rng.randrange(10**6)}", f"Page {i} on {host}", rng.randrange(1, 20), t
+
+def chrome_profile(prof: Path, n, rng):
+    """History, Cookies and Bookmarks with n urls."""
+    prof.mkdir(parents=True)
+    con = _db(prof / "History", CHROME_HISTORY)
+    _load(con, "INSERT INTO urls VALUES (?,?,?,?,0,?,0)", _urls(rng, n, WEBKIT_BASE, 2000000))
+    con.execute("INSERT INTO visits(url, visit_time, transition) SELECT id, last_visit_time, 805306368 FROM urls")
+    con.execute("INSERT INTO keyword_search_terms SELECT 1, id, 'term ' || id, 'term ' || id FROM urls WHERE id % 10 = 0")
+    con.execute("INSERT INTO downloads SELECT id, 'guid' || id, '/tmp/dl' || id, '/home/bench/Downloads/file' || id || '.zip', "
+                "last_visit_time, url FROM urls WHERE id % 20 = 0")
+    con.execute("INSERT INTO downloads_url_chains SELECT id, 0, tab_url FROM downloads")
+    _close(con)
+
+    con = _db(prof / "Cookies", CHROME_COOKIES)
+    _load(con, "INSERT INTO cookies VALUES (?, ?, '', ?, ?, x'00', '/', 0, 1, 1, ?)",
+          ((WEBKIT_BASE + i, f".site{rng.randrange(HOSTS)}.example.com", f"c{i}", "v10" if i % 2 else f"value{i}",
+            WEBKIT_BASE + i * 1000003) for i in range(n // 2)))
+    _close(con)
+
+    # Bookmarks: folders of 100 urls under the bookmark bar
+    folders = [{"type": "folder", "name": f"Folder {f}", "date_added": str(WEBKIT_BASE + f), "children": [
+        {"type": "url", "name": f"Bookmark {i}", "url": f"https://site{i % HOSTS}.example.com/bm/{i}",
+         "date_added": str(WEBKIT_BASE + i * 1000)} for i in range(f, min(f + 100, n // 50))]}
+        for f in range(0, n // 50, 100)]
+    bm = {"checksum": "", "version": 1, "roots": {
+        "bookmark_bar": {"type": "folder", "name": "Bookmarks bar", "children": folders},
+        "other": {"type": "folder", "name": "Other bookmarks", "children": []}}}
+    (prof / "Bookmarks").write_text(json.dumps(bm), encoding="utf-8")
+
+def firefox_profile(prof: Path, n, rng):
+    """places.sqlite, cookies.sqlite and formhistory.sqlite with n places."""
+    prof.mkdir(parents=True)
+    con = _db(prof / "places.sqlite", FIREFOX_PLACES)
+    _load(con, "INSERT INTO moz_places(id, url, title, visit_count, last_visit_date) VALUES (?,?,?,?,?)",
+          _urls(rng, n, UNIX_BASE, 2000000))
+    con.execute("INSERT INTO moz_historyvisits(place_id, visit_date, visit_type) SELECT id, last_visit_date, 1 FROM moz_places")
+    _close(con)
+
+    con = _db(prof / "cookies.sqlite", FIREFOX_COOKIES)
+    _load(con, "INSERT INTO moz_cookies(name, value, host, lastAccessed) VALUES (?,?,?,?)",
+          ((f"c{i}", f"value{i}", f".site{rng.randrange(HOSTS)}.example.com", UNIX_BASE + i * 1000003) for i in range(n // 2)))
+    _close(con)
+
+    con = _db(prof / "formhistory.sqlite", FIREFOX_FORMHISTORY)
+    _load(con, "INSERT INTO moz_formhistory(fieldname, value, timesUsed, lastUsed) VALUES ('searchbar-history',?,?,?)",
+          ((f"search {i}", rng.randrange(1, 50), UNIX_BASE + i * 1000003) for i in range(n // 5)))
+    _close(con)
+
+def delete_rows(con, table, where, params=()):
+    """Delete like a browser does (secure_delete off, so the records stay carvable); returns the deleted rows."""
+    con.execute("PRAGMA secure_delete=OFF")
+    gone = con.execute(f"SELECT * FROM {table} WHERE {where}", params).fetchall()
+    con.execute(f"DELETE FROM {table} WHERE {where}", params)
+    con.commit()
+    return gone
+
+# ---- Session file encoders (the inverse of modules/sessions.py, for tests) ----
+def lz4_block(data):
+    """Raw LZ4 block: greedy 4-byte matches, the last sequence literals only."""
+    out, table, i, anchor, n = bytearray(), {}, 0, 0, len(data)
+
+    def length(v):   # 15 in the token, then 255s and the remainder
+        while v >= 255:
+            out.append(255)
+            v -= 255
+        out.append(v)
+
+    while i + 12 < n:   # LZ4 ends with at least 5 literals and never matches in the last 12 bytes
+        j = table.get(data[i:i + 4])
+        table[data[i:i + 4]] = i
+        if j is None or i - j >= 65536:
+            i += 1
+            continue
+        m = 4
+        while i + m < n - 5 and data[j + m] == data[i + m]:
+            m += 1
+        lit = i - anchor
+        out.append((min(lit, 15) << 4) | min(m - 4, 15))
+        if lit >= 15:
+            length(lit - 15)
+        out += data[anchor:i] + struct.pack("<H", i - j)
+        if m - 4 >= 15:
+            length(m - 4 - 15)
+        i = anchor = i + m
+    lit = n - anchor
+    out.append(min(lit, 15) << 4)
+    if lit >= 15:
+        length(lit - 15)
+    return bytes(out + data[anchor:])
+
+def mozlz4(data):
+    """Firefox .jsonlz4: magic, uint32 decoded size, one LZ4 block."""
+    return b"mozLz40\0" + struct.pack("<I", len(data)) + lz4_block(data)
+
+def pickle(*fields):
+    """base::Pickle from (kind, value) fields: "i" int32, "q" int64, "s" UTF-8 string, "w" UTF-16 string."""
+    body = bytearray()
+    for kind, v in fields:
+        if kind in "iq":
+            body += struct.pack("<" + kind, v)
+        else:
+            b = v.encode("utf-8" if kind == "s" else "utf-16-le")
+            body += struct.pack("<i", len(v) if kind == "w" else len(b)) + b + b"\0" * (-len(b) % 4)
+    return struct.pack("<I", len(body)) + bytes(body)
+
+def snss_navigation(tab_id, index, url, title, ts):
+    """UpdateTabNavigation payload with a webkit timestamp."""
+    return pickle(("i", tab_id), ("i", index), ("s", url), ("w", title), ("s", "state"), ("i", 1), ("i", 0),
+                  ("s", ""), ("i", 0), ("s", url), ("i", 0), ("q", ts))
+
+def snss(commands):
+    """Chromium SNSS file from (command id, payload) records."""
+    out = bytearray(b"SNSS" + struct.pack("<i", 3))
+    for cid, payload in commands:
+        out += struct.pack("<H", len(payload) + 1) + bytes([cid]) + payload
+    return bytes(out)
+
+def generate(root, rows=10000, profiles=1, seed=1):
+    """
+    Build (or reuse) an evidence root with `profiles` Chrome and `profiles`
+    Firefox profiles sharing `rows` history rows between them. Other tables
+    scale with it (cookies 1/2, form history 1/5, searches 1/10, downloads
+    1/20, bookmarks 1/50 of a profile's urls). Returns the root.
+    """
+    root = Path(root)
+    params = {"rows": rows, "profiles": profiles, "seed": seed}
+    marker = root / "fixture.json"
+    if marker.exists() and json.loads(marker.read_text(encoding="utf-8")) == params:
+        return root
+    shutil.rmtree(root, ignore_errors=True)
+    rng = random.Random(seed)
+    per_profile = max(1, rows // (2 * profiles))
+    home = root / "home" / "bench"
+    for p in range(profiles):
+        chrome_profile(home / ".config/google-chrome" / ("Default" if p == 0 else f"Profile {p}"), per_profile, rng)
+        firefox_profile(home / f".mozilla/firefox/bench{p:03d}.default-release", per_profile, rng)
+    marker.write_text(json.dumps(params), encoding="utf-8")
+    return root
@@ -0,0 +1,161 @@
+"""
+Frostveil benchmark runner.
+
+Generates (or reuses) a synthetic evidence root, then times every extractor
+and every output format against it. Each case runs in a fresh process so its
+peak RSS is its own. Results are written as JSON; pass --compare with an
+earlier result file to see the change in rows/sec per case.
+
+    python benchmarks/run.py --rows 1000000 --profiles 10 --repeat 3 --out after.json --compare before.json
+"""
+import argparse, contextlib, json, os, platform, shutil, subprocess, sys, tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+from pathlib import Path
+from time import perf_counter
+
+REPO = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO))
+
+import main
+from benchmarks import fixtures
+from modules import context, discovery, profiling, utils, writers
+
+def short(ex):
+    return ex.__name__.rsplit(".", 1)[-1]
+
+def run_case(case, root, workdir, workers=1, acquire="copy", compress=False, visits=False, recover=False):
+    """One case in a fresh process: "discovery", "extract:<extractor>" or "write:<format>"."""
+    os.chdir(workdir)
+    with open(os.devnull, "w") as quiet, contextlib.redirect_stdout(quiet):   # no per-profile progress lines
+        result = _measure(case, root, workers, acquire, compress, visits, recover)
+    utils.close_log()
+    return result
+
+def _measure(case, root, workers, acquire, compress, visits, recover):
+    kind, _, name = case.partition(":")
+    result = {"case": case}
+    t = perf_counter()
+    profiles, _ = discovery.inventory(root)
+    if kind == "discovery":
+        wall, rows = perf_counter() - t, len(profiles)
+    else:
+        ctx = context.RunContext(utils.get_metadata(), acquire=acquire, visits=visits, recover=recover)
+        errors = []
+        try:
+            if kind == "extract":
+                ex = next(e for e in main.EXTRACTORS if short(e) == name)
+                t = perf_counter()
+                rows = sum(1 for _ in main.iter_rows(profiles, [ex], ctx, errors, workers=workers))
+            else:
+                prof = profiling.Profiler()
+                t = perf_counter()
+                outputs, counts = main.write_outputs(main.iter_rows(profiles, main.EXTRACTORS, ctx, errors, workers=workers),
+                                                     name, f"bench.{name}", ctx.meta, compress=compress, profiler=prof)
+                rows = sum(counts.values())
+                result["write_s"] = round(prof.write_s, 6)
+                result["output_bytes"] = sum(Path(o).stat().st_size for o in outputs)
+            wall = perf_counter() - t
+        finally:
+            ctx.close()
+        result["errors"] = len(errors)
+    result.update(rows=rows, wall_s=round(wall, 6), rows_per_s=round(rows / wall, 1) if wall else None,
+                  peak_rss_mb=profiling.peak_rss_mb())
+    return result
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline_path, threshold):
+    """Print rows/sec against a baseline result file. Returns the cases that regressed beyond threshold."""
+    data = json.loads(Path(baseline_path).read_text(encoding="utf-8"))
+    if data.get("params") != results["params"]:
+        print(f"[!] Baseline was run with different parameters: {data.get('params')}")
+    baseline = {c["case"]: c for c in data["cases"]}
+    regressed = []
+    print(f"\n{'case':<24}{'before':>14}{'after':>14}{'change':>10}")
+    for c in results["cases"]:
+        old = baseline.get(c["case"])
+        if not old or not old.get("rows_per_s") or not c.get("rows_per_s"):
+            continue
+        change = c["rows_per_s"] / old["rows_per_s"] - 1
+        flag = ""
+        if change < -threshold:
+            flag = "  REGRESSION"
+            regressed.append(c["case"])
+        print(f"{c['case']:<24}{old['rows_per_s']:>14,.0f}{c['rows_per_s']:>14,.0f}{change:>+10.1%}{flag}")
+    return regressed
+
+def main_cli():
+    ap = argparse.ArgumentParser(prog="frostveil-bench", description="Benchmark Frostveil extractors and writers on synthetic profiles.")
+    ap.add_argument("--rows", type=int, default=10000, help="history rows across all profiles (default 10000)")
+    ap.add_argument("--profiles", type=int, default=1, help="Chrome and Firefox profiles each (default 1)")
+    ap.add_argument("--seed", type=int, default=1, help="fixture random seed")
+    ap.add_argument("--fixtures", help="fixture directory (default: a per-size directory under the system temp dir)")
+    ap.add_argument("--formats", nargs="+", choices=list(writers.SINKS), default=list(writers.SINKS), help="output formats to time")
+    ap.add_argument("--extractors", nargs="+", choices=[short(e) for e in main.EXTRACTORS],
+                    default=[short(e) for e in main.EXTRACTORS], help="extractors to time")
+    ap.add_argument("--compress", action="store_true", help="gzip the write:<format> outputs")
+    ap.add_argument("--acquire", choices=context.ACQUIRE_MODES, default="copy")
+    ap.add_argument("--visits", action="store_true", help="extract history per visit")
+    ap.add_argument("--recover", action="store_true", help="time the recovery extractor too")
+    ap.add_argument("--workers", type=int, default=1, help="extraction workers per case")
+    ap.add_argument("--repeat", type=int, default=1, help="runs per case; the fastest is kept")
+    ap.add_argument("--out", default="bench_results.json", help="result file")
+    ap.add_argument("--compare", metavar="RESULTS_JSON", help="earlier result file to compare against")
+    ap.add_argument("--threshold", type=float, default=0.10, help="rows/sec drop reported as a regression (default 0.10)")
+    args = ap.parse_args()
+
+    fixture_dir = Path(args.fixtures or Path(tempfile.gettempdir()) / "frostveil-bench" /
+                       f"r{args.rows}-p{args.profiles}-s{args.seed}").resolve()
+    print(f"[.] Fixtures: {fixture_dir}")
+    t = perf_counter()
+    root = fixtures.generate(fixture_dir / "root", rows=args.rows, profiles=args.profiles, seed=args.seed)
+    print(f"[.] Ready in {perf_counter() - t:.1f}s")
+    workdir = Path(tempfile.mkdtemp(prefix="frostveil_bench_"))
+
+    cases = ["discovery"] + [f"extract:{e}" for e in args.extractors] + [f"write:{f}" for f in args.formats]
+    results = {
+        "commit": git_commit(),
+        "started_utc": datetime.utcnow().isoformat() + "Z",
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "params": {k: getattr(args, k) for k in ("rows", "profiles", "seed", "compress", "acquire", "visits", "recover", "workers", "repeat")},
+        "cases": [],
+    }
+    ctx = get_context("spawn")
+    try:
+        for case in cases:
+            best = None
+            for _ in range(args.repeat):
+                with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                    r = pool.submit(run_case, case, root, workdir, args.workers, args.acquire, args.compress,
+                                      args.visits, args.recover).result()
+                if best is None or r["wall_s"] < best["wall_s"]:
+                    best = r
+            best["runs"] = args.repeat
+            results["cases"].append(best)
+            extra = f", {best['output_bytes'] / 1e6:.1f} MB" if "output_bytes" in best else ""
+            print(f"{case:<24}{best['rows']:>12,} rows {best['wall_s']:>9.3f}s {best['rows_per_s'] or 0:>14,.0f} rows/s "
+                  f"{best['peak_rss_mb']} MB RSS{extra}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"[+] Results: {args.out}")
+    if args.compare:
+        regressed = compare(results, args.compare, args.threshold)
+        if regressed:
+            print(f"[!] Slower than baseline: {', '.join(regressed)}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -1,64 +1,85 @@
-import argparse, json, csv, sqlite3, gzip
+import argparse, json, os, re
+from modules import history, bookmarks, cookies, downloads, searches, sessions, extensions, utils, report, writers, scheduler, context, state, profiling, discovery, compress, urlindex, filters, recovery, columnar
+from time import perf_counter
 from pathlib import Path
-from modules import history, bookmarks, cookies, downloads, searches, sessions, extensions, utils, report
-
-def write_outputs(rows, fmt, out, compress=False, split_artifacts=False, per_browser=False):
-    """Write extracted rows to disk in chosen format(s)."""
-    outputs = []
-    if not rows:
-        return outputs
-
-    def open_out(path):
-        if compress:
-            return gzip.open(path, "wt", encoding="utf-8")
-        return open(path, "w", encoding="utf-8")
-
-    # Group rows if needed
-    if split_artifacts or per_browser:
-        groups = {}
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+EXTRACTORS = [history, bookmarks, cookies, downloads, searches, sessions, extensions, recovery]
+ARTIFACTS = [ex.__name__.rsplit(".", 1)[-1] for ex in EXTRACTORS]
+
+def write_outputs(rows, fmt, out, meta, compress=False, split_artifacts=False, per_browser=False, timeline=None,
+                  profiler=None, urls=None, json_compact=False, write_workers=1):
+    """
+    Stream extracted rows to disk in chosen format(s), feeding the optional
+    writers.TimelineSink on the way. Returns ({output: sha256}, counts).
+    With urls (a urlindex.UrlIndex) rows carry URL IDs and the index is
+    written as a "<out>_urls" dimension table (the timeline keeps plain
+    URLs). Split outputs are written
+    by write_workers processes. Time spent writing (not extracting) is
+    added to profiler.write_s.
+    """
+    options = {"compact": True} if fmt == "json" and json_compact else {}
+    writer = writers.StreamWriter(fmt, out, meta, compress=compress, split_artifacts=split_artifacts,
+                                  per_browser=per_browser, options=options, workers=write_workers)
+    spent = 0.0
+    try:
         for r in rows:
-            key = []
-            if per_browser:
-                key.append(r["browser"])
-            if split_artifacts:
-                key.append(r["artifact"])
-            groups.setdefault("_".join(key), []).append(r)
-    else:
-        groups = {"all": rows}
-
-    for gname, grows in groups.items():
-        outname = out
-        stem, suf = Path(out).stem, Path(out).suffix
-        if gname != "all":
-            outname = f"{stem}_{gname}{suf}"
-        outputs.append(Path(outname))
-
-        if fmt == "csv":
-            with open_out(outname) as f:
-                w = csv.DictWriter(f, fieldnames=grows[0].keys())
-                w.writeheader()
-                for r in grows:
-                    w.writerow(r)
-
-        elif fmt == "json":
-            with open_out(outname) as f:
-                json.dump(grows, f, indent=2, ensure_ascii=False)
-
-        elif fmt == "jsonl":
-            with open_out(outname) as f:
-                for r in grows:
-                    f.write(json.dumps(r, ensure_ascii=False) + "\n")
-
-        elif fmt == "sqlite":
-            conn = sqlite3.connect(outname)
-            cols = list(grows[0].keys())
-            conn.execute(f"CREATE TABLE data ({','.join(cols)})")
-            conn.executemany(f"INSERT INTO data VALUES ({','.join(['?']*len(cols))})",
-                             [tuple(r[c] for c in cols) for r in grows])
-            conn.commit()
-            conn.close()
-
-    return outputs
+            t = perf_counter()
+            if timeline:
+                timeline.write(r)
+            if urls is not None:
+                r = urls.ref(r)
+            writer.write(r)
+            spent += perf_counter() - t
+    finally:
+        t = perf_counter()
+        outputs = writer.close()
+        if timeline:
+            timeline.close()
+            outputs[timeline.path] = timeline.digest
+        if urls is not None:
+            table = writers.SINKS[fmt](writers.sibling(out, "urls"), {}, compress, columns=urlindex.COLUMNS, **options)
+            for entry in urls.rows():
+                table.write(entry)
+            table.close()
+            outputs[table.path] = table.digest
+        spent += perf_counter() - t
+        if profiler:
+            profiler.write_s += spent
+    return outputs, writer.counts
+
+def iter_rows(profiles, extractors, ctx, errors, workers=1, profiler=None):
+    """
+    Yield rows from every extractor over every discovered profile, recording
+    failures in errors. Rows are checked against ctx.filters as they leave
+    each extractor.
+    """
+    jobs = [(i, p, ex) for i, (p, ex) in enumerate((p, ex) for p in profiles for ex in extractors)]
+    current = []
+
+    def on_start(job):
+        _, p, _ = job
+        if current != [p]:
+            current[:] = [p]
+            utils.progress(f"Processing {p.browser} {p.path}")
+
+    def on_error(job, e):
+        _, p, _ = job
+        msg = f"ERROR {p.browser} {p.path}: {e}"
+        errors.append(msg)
+        utils.log_line(msg)
+
+    def run(job):
+        i, p, ex = job
+        rows = ex.extract(p, ctx)
+        if ctx.filters:
+            rows = ctx.filters.rows(rows)
+        if profiler:
+            rows = profiler.track(i, p.browser, p.path, ex.__name__.rsplit(".", 1)[-1], rows)
+        return rows
+
+    return scheduler.run(jobs, run, workers=workers, on_start=on_start, on_error=on_error)
 
 BANNER = r"""
  _______  ______  _____  _______ _______ _    _ _______ _____       
@@ -67,71 +88,253 @@ BANNER = r"""
                                                                      
 """
 
-def main():
-    print(BANNER)
-    print("Frostveil | Browser Forensics Toolkit — unveiling traces hidden beneath the frost\n")
-    ap = argparse.ArgumentParser(
-        prog="frostveil",
-        description="Frostveil | Browser Forensics Toolkit — fast, portable, forensic-grade extraction of browser artifacts (Chrome, Edge, Firefox)."
-    )
-    ap.add_argument("--format", choices=["csv", "json", "jsonl", "sqlite"], default="csv", help="Output format")
-    ap.add_argument("--out", default="artifacts_export.csv", help="Output file name")
-    ap.add_argument("--per-browser", action="store_true", help="separate outputs per browser")
-    ap.add_argument("--split-artifacts", action="store_true", help="separate outputs per artifact")
-    ap.add_argument("--compress", action="store_true", help="gzip compress output files")
-    ap.add_argument("--timeline", action="store_true", help="export unified timeline JSON")
-    ap.add_argument("--report", action="store_true", help="generate human-readable Markdown report")
-    args = ap.parse_args()
+def make_filters(args):
+    return filters.Filters(browsers=args.browsers, artifacts=args.artifacts, domains=args.domain,
+                           start=args.time_from, end=args.time_to, profile_globs=args.profile_glob)
 
+def run(args, root=None):
+    """
+    One acquisition: the live host, or the mounted image at root. Outputs,
+    manifest and log go to the current directory. Returns the manifest.
+    """
+    profiler = profiling.Profiler(deep=args.profile)
     meta = utils.get_metadata()
+    if root is not None:
+        meta["evidence_root"] = str(root)
     utils.log_line(f"=== Acquisition started metadata={meta} ===")
 
-    browsers = utils.find_browsers()
-    all_rows, errors = [], []
-
-    extractors = [history, bookmarks, cookies, downloads, searches, sessions, extensions]
-
-    for b, paths in browsers.items():
-        for p in paths:
-            utils.progress(f"Processing {b} {p}")
-            for ex in extractors:
-                try:
-                    all_rows.extend(ex.extract(b, p, meta))
-                except Exception as e:
-                    msg = f"ERROR {b} {p}: {e}"
-                    errors.append(msg)
-                    utils.log_line(msg)
-
-    outputs = write_outputs(all_rows, args.format, args.out, compress=args.compress,
-                            split_artifacts=args.split_artifacts, per_browser=args.per_browser)
+    filt = make_filters(args)
+    profiles, cached = discovery.inventory(root, cache=args.discovery_cache)
+    profiles = filt.profiles(profiles)
+    browsers = list(dict.fromkeys(p.browser for p in profiles))
+    errors = []
 
+    delta = state.DeltaState(args.since_state) if args.since_state else None
+    baseline = delta.baseline_info() if delta else None
+    ctx = context.RunContext(meta, acquire=args.acquire, state=delta, visits=args.visits, filters=filt,
+                             recover=args.recover, hash_cache=args.hash_cache)
+    urls = urlindex.UrlIndex() if args.url_table else None
+    compression = compress.Options(args.compress_codec, args.compress_level, args.compress_threads) if args.compress else False
+    timeline = None
     if args.timeline:
-        tpath = Path("timeline.json")
-        with open(tpath, "w", encoding="utf-8") as f:
-            json.dump(sorted([r for r in all_rows if r.get("visit_time_utc")],
-                             key=lambda r: r["visit_time_utc"]),
-                      f, indent=2, ensure_ascii=False)
-        outputs.append(tpath)
-
-    manifest = utils.build_manifest(meta, outputs, all_rows, errors)
+        timeline = writers.TimelineSink(f"timeline.{args.timeline_format}", meta, fmt=args.timeline_format,
+                                        start=filt.start_iso, end=filt.end_iso)
+    try:
+        rows = iter_rows(profiles, filt.extractors(EXTRACTORS), ctx, errors, workers=args.workers, profiler=profiler)
+        outputs, counts = write_outputs(rows, args.format, args.out, meta, compress=compression,
+                                        split_artifacts=args.split_artifacts, per_browser=args.per_browser,
+                                        timeline=timeline, profiler=profiler, urls=urls,
+                                        json_compact=args.json_compact, write_workers=args.write_workers)
+    finally:
+        ctx.close()
+    t = perf_counter()
+    sources = ctx.sources.finish()
+    profiler.hash_s += perf_counter() - t
+
+    if delta:
+        delta.save(meta)
+    manifest = utils.build_manifest(meta, outputs, counts, errors,
+                                    acquisition=dict(sorted(ctx.methods.items())), sources=sources,
+                                    delta=({"baseline": baseline, "rows": "new or updated since baseline"} if baseline
+                                           else {"baseline": None, "rows": "full"}) if delta else None,
+                                    performance=profiler.report(), filters=filt.describe())
     with open("manifest.json", "w", encoding="utf-8") as f:
         json.dump(manifest, f, indent=2)
     utils.sign_manifest("manifest.json")
 
     if args.report:
         report.generate(manifest)
+    profile_files = profiler.dump()
 
     print("\n=== Frostveil Extraction Summary ===")
     print(f"Host: {meta['hostname']} User: {meta['username']} OS: {meta['os']}")
     print(f"Acquired at: {meta['acquired_utc']}")
-    print(f"Browsers scanned: {', '.join(browsers.keys())}")
+    if root is not None:
+        print(f"Evidence root: {root}")
+    print(f"Browsers scanned: {', '.join(browsers)} ({len(profiles)} profiles{', cached inventory' if cached else ''})")
     print(f"Artifacts collected: {{ {', '.join(f'{k}: {v}' for k,v in manifest['counts'].items())} }}")
     print(f"Output files: {[str(x) for x in outputs]}")
+    if urls is not None:
+        print(f"URL index: {len(urls.entries)} distinct URLs/hosts")
+    perf = manifest["performance"]
+    print(f"Time: {perf['total_s']:.2f}s (extract {perf['extract_s']:.2f}s, write {perf['write_s']:.2f}s, "
+          f"hash {perf['hash_s']:.2f}s), "
+          f"copied {perf['bytes_copied'] / 1e6:.1f} MB, peak RSS {perf['peak_rss_mb']} MB")
+    if profile_files:
+        print(f"Profile: {[str(x) for x in profile_files]}")
     if errors:
         print("\n[!] Errors/Access Denied:")
         for e in errors:
             print("   -", e)
         print(f"\n[!] Total errors/access denied: {len(errors)}")
+    utils.close_log()
+    return manifest
+
+def image_dir(batch_dir, root, taken):
+    """Output directory for one evidence root, named after its path."""
+    name = re.sub(r"[^A-Za-z0-9._-]+", "_", str(root)).strip("_") or "root"
+    d, n = batch_dir / name, 1
+    while d in taken:
+        n += 1
+        d = batch_dir / f"{name}_{n}"
+    taken.add(d)
+    return d
+
+def run_image(args, root, out_dir):
+    """Batch worker (own process): acquire one evidence root into out_dir."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    os.chdir(out_dir)
+    t = perf_counter()
+    summary = {"evidence_root": str(root), "out_dir": str(out_dir)}
+    try:
+        manifest = run(args, root)
+    except Exception as e:
+        utils.log_line(f"ERROR batch image {root}: {e}")
+        utils.close_log()
+        summary.update(status="failed", error=str(e), total_s=round(perf_counter() - t, 6))
+        return summary
+    summary.update(status="ok", counts=manifest["counts"], errors=len(manifest["errors"]),
+                   manifest_sha256=utils.sha256_file("manifest.json"), total_s=round(perf_counter() - t, 6))
+    return summary
+
+def run_batch(args, roots):
+    """
+    Fan evidence roots out over worker processes. Each image gets its own
+    directory under --batch-dir with its outputs and manifest; the aggregate
+    batch_summary.json lists them in the order given.
+    """
+    batch_dir = Path(args.batch_dir).resolve()
+    batch_dir.mkdir(parents=True, exist_ok=True)
+    taken = set()
+    dirs = [image_dir(batch_dir, r, taken) for r in roots]
+    workers = max(1, min(args.batch_workers or os.cpu_count() or 1, len(roots)))
+    started = datetime.utcnow().isoformat() + "Z"
+    t = perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_image, args, r, d) for r, d in zip(roots, dirs)]
+        images = []
+        for r, d, fut in zip(roots, dirs, futures):
+            try:
+                images.append(fut.result())
+            except Exception as e:   # worker process died
+                images.append({"evidence_root": str(r), "out_dir": str(d), "status": "failed", "error": str(e)})
+    counts = {}
+    for img in images:
+        for k, v in img.get("counts", {}).items():
+            counts[k] = counts.get(k, 0) + v
+    summary = {
+        "started_utc": started,
+        "finished_utc": datetime.utcnow().isoformat() + "Z",
+        "total_s": round(perf_counter() - t, 6),
+        "workers": workers,
+        "images": images,
+        "totals": {
+            "images": len(images),
+            "failed": sum(img["status"] != "ok" for img in images),
+            "errors": sum(img.get("errors", 0) for img in images),
+            "counts": counts,
+        },
+    }
+    with open(batch_dir / "batch_summary.json", "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+
+    print("\n=== Frostveil Batch Summary ===")
+    for img in images:
+        status = f"{sum(img['counts'].values())} rows" if img["status"] == "ok" else f"FAILED: {img['error']}"
+        print(f"{img['evidence_root']} -> {img['out_dir']}: {status}")
+    print(f"Images: {len(images)} ({summary['totals']['failed']} failed) in {summary['total_s']:.2f}s with {workers} workers")
+    print(f"Summary: {batch_dir / 'batch_summary.json'}")
+    return summary
+
+def evidence_roots(args):
+    roots = list(args.evidence_root or [])
+    if args.evidence_list:
+        for line in Path(args.evidence_list).read_text(encoding="utf-8").splitlines():
+            line = line.strip()
+            if line and not line.startswith("#"):
+                roots.append(line)
+    return [Path(r).resolve() for r in roots]
+
+def main():
+    print(BANNER)
+    print("Frostveil | Browser Forensics Toolkit — unveiling traces hidden beneath the frost\n")
+    ap = argparse.ArgumentParser(
+        prog="frostveil",
+        description="Frostveil | Browser Forensics Toolkit — fast, portable, forensic-grade extraction of browser artifacts (Chrome, Edge, Firefox)."
+    )
+    ap.add_argument("--format", choices=list(writers.SINKS), default="csv", help="Output format")
+    ap.add_argument("--out", default="artifacts_export.csv", help="Output file name")
+    ap.add_argument("--json-compact", action="store_true", help="json: one unindented element per line")
+    ap.add_argument("--per-browser", action="store_true", help="separate outputs per browser")
+    ap.add_argument("--split-artifacts", action="store_true", help="separate outputs per artifact")
+    ap.add_argument("--compress", action="store_true", help="compress output files (gzip unless --compress-codec)")
+    ap.add_argument("--compress-codec", choices=compress.CODECS, default="gzip",
+                    help="gzip, or zstd if the zstandard package is installed")
+    ap.add_argument("--compress-level", type=int, help="compression level (default: gzip 6, zstd 3)")
+    ap.add_argument("--compress-threads", type=int, help="threads compressing blocks in parallel (default: CPU count)")
+    ap.add_argument("--visits", action="store_true",
+                    help="history: one row per visit (time ordered) instead of one per URL")
+    ap.add_argument("--recover", action="store_true",
+                    help="also carve deleted history and cookie records from free pages and the WAL")
+    ap.add_argument("--url-table", action="store_true",
+                    help="write normalized URLs/hosts once to <out>_urls and reference them by ID in the rows")
+    ap.add_argument("--timeline", action="store_true", help="export unified timeline JSON")
+    ap.add_argument("--timeline-format", choices=["json", "jsonl"], default="json", help="timeline as JSON array or JSON lines")
+    ap.add_argument("--from", dest="time_from", metavar="ISO_TIME", help="only rows at or after this time (UTC unless an offset is given)")
+    ap.add_argument("--to", dest="time_to", metavar="ISO_TIME", help="only rows before this time")
+    ap.add_argument("--browsers", nargs="+", choices=list(discovery.FAMILIES), help="only these browsers")
+    ap.add_argument("--artifacts", nargs="+", choices=ARTIFACTS, help="only these extractors")
+    ap.add_argument("--domain", action="append", help="only rows for this domain or its subdomains (repeatable)")
+    ap.add_argument("--profile-glob", action="append", metavar="GLOB",
+                    help="only profiles whose path or directory name matches (repeatable)")
+    ap.add_argument("--report", action="store_true", help="generate human-readable Markdown report")
+    ap.add_argument("--acquire", choices=context.ACQUIRE_MODES, default="copy",
+                    help="copy: snapshot databases before reading; direct: open them in place read-only (mounted evidence)")
+    ap.add_argument("--since-state", metavar="STATE_JSON",
+                    help="delta mode: only export rows new since the run recorded in this state file (created/updated)")
+    ap.add_argument("--profile", action="store_true",
+                    help="also write cProfile/tracemalloc data (profile.pstats, profile.txt)")
+    ap.add_argument("--workers", type=int, default=1, help="number of extraction jobs to run in parallel")
+    ap.add_argument("--write-workers", type=int, default=1,
+                    help="processes writing --per-browser/--split-artifacts outputs concurrently")
+    ap.add_argument("--discovery-cache", metavar="CACHE_JSON",
+                    help="reuse the profile inventory in this file while its directories are unchanged (created/updated)")
+    ap.add_argument("--hash-cache", metavar="CACHE_JSON",
+                    help="reuse source hashes from this file for files whose size, mtime and inode are unchanged (created/updated)")
+    ap.add_argument("--evidence-root", action="append", metavar="DIR",
+                    help="scan a mounted image instead of the live host (repeat for a batch)")
+    ap.add_argument("--evidence-list", metavar="FILE", help="batch: file listing evidence roots, one per line")
+    ap.add_argument("--batch-dir", default="frostveil_batch", help="batch: parent directory of the per-image outputs")
+    ap.add_argument("--batch-workers", type=int, help="batch: images processed in parallel (default: CPU count)")
+    args = ap.parse_args()
+
+    if args.compress and args.format == "columnar":
+        ap.error(f"--compress does not apply to --format columnar: .fvc column chunks are always {columnar.CODEC}-compressed")
+    if not compress.available(args.compress_codec):
+        ap.error("--compress-codec zstd needs the 'zstandard' package")
+    if args.compress_level is not None and args.compress_level not in compress.LEVELS[args.compress_codec]:
+        levels = compress.LEVELS[args.compress_codec]
+        ap.error(f"--compress-level for {args.compress_codec} must be {levels.start}-{levels.stop - 1}")
+    try:
+        filt = make_filters(args)
+    except ValueError as e:
+        ap.error(f"invalid filter: {e}")
+    if filt and args.since_state:
+        # the state marks would move past rows the filters left out
+        ap.error("--since-state cannot be combined with --domain, --from or --to")
+    roots = evidence_roots(args)
+    for r in roots:
+        if not r.is_dir():
+            ap.error(f"evidence root is not a directory: {r}")
+    if len(roots) > 1:
+        # Each image runs inside its own output directory, so paths must be relative to it
+        for opt, val in (("--out", args.out), ("--since-state", args.since_state),
+                         ("--discovery-cache", args.discovery_cache), ("--hash-cache", args.hash_cache)):
+            if val and Path(val).is_absolute():
+                ap.error(f"{opt} must be a relative path in batch mode (one per image)")
+        run_batch(args, roots)
+    else:
+        run(args, roots[0] if roots else None)
 
 
 if __name__ == "__main__":
@@ -1,48 +1,66 @@
 import json
-from pathlib import Path
 from . import utils
 
-def extract(browser, path: Path, meta):
-    rows = []
-    if browser in ["chrome","edge"]:
-        bm_file = path.parent / "Bookmarks"
-        if bm_file.exists():
+def walk_chromium(data):
+    """
+    (url, title, folder path, date_added) for every bookmark in a parsed
+    Chromium Bookmarks file, in file order. Iterative and only follows
+    "children", so meta_info/sync_metadata blobs are never visited and deep
+    folder trees cannot hit the recursion limit.
+    """
+    roots = [r for r in (data.get("roots") or {}).values() if isinstance(r, dict)]
+    stack = [(node, "") for node in reversed(roots)]
+    while stack:
+        node, parent = stack.pop()
+        if node.get("type") == "url":
             try:
-                data = json.loads(bm_file.read_text(encoding="utf-8"))
-                def walk(node):
-                    if isinstance(node, dict):
-                        if node.get("type")=="url":
-                            rows.append({
-                                **meta, "browser": browser, "artifact": "bookmark",
-                                "profile": str(path.parent), "url": node.get("url",""),
-                                "title": node.get("name",""), "visit_count": None,
-                                "visit_time_utc": None, "extra": ""
-                            })
-                        for v in node.values(): walk(v)
-                    elif isinstance(node, list):
-                        for v in node: walk(v)
-                walk(data)
+                added = int(node.get("date_added") or 0)
+            except ValueError:
+                added = 0
+            yield node.get("url", ""), node.get("name", ""), parent, added
+            continue
+        children = node.get("children")
+        if isinstance(children, list):
+            path = f"{parent}/{node.get('name', '')}" if parent else node.get("name", "")
+            stack.extend((c, path) for c in reversed(children) if isinstance(c, dict))
+
+def extract(profile, ctx):
+    browser, prof = profile.browser, profile.path
+    if profile.family == "chromium":
+        bm_file = profile.file("Bookmarks")
+        key = ctx.key(browser, prof, "bookmark")
+        if bm_file and not ctx.unchanged(key, bm_file):
+            try:
+                data = json.loads(bm_file.read_bytes())
+                for url, title, folder, added in walk_chromium(data):
+                    yield utils.Row(
+                        browser=browser, artifact="bookmark",
+                        profile=str(prof), url=url, title=title,
+                        visit_count=None, visit_time_utc=utils.utc_from_webkit(added),
+                        extra=f"folder={folder}"
+                    )
+                ctx.advance(key)
                 utils.log_line(f"Bookmarks extracted from {bm_file}")
             except Exception as e:
                 utils.log_line(f"Error bookmarks {browser}: {e}")
-    elif browser=="firefox":
-        profs = path.glob("*.default*") if path.is_dir() else []
-        for prof in profs:
-            bm_file = prof / "places.sqlite"
-            tmp = utils.safe_copy(bm_file)
-            if not tmp: continue
-            try:
-                import sqlite3
-                con = sqlite3.connect(str(tmp))
-                cur = con.cursor()
-                cur.execute("SELECT url, title FROM moz_places WHERE title IS NOT NULL")
-                for url, title in cur.fetchall():
-                    rows.append({
-                        **meta, "browser": "firefox", "artifact": "bookmark",
-                        "profile": str(prof), "url": url, "title": title,
-                        "visit_count": None, "visit_time_utc": None, "extra": ""
-                    })
-                con.close()
-            except Exception as e:
-                utils.log_line(f"Error bookmarks firefox {prof}: {e}")
-    return rows
+    elif profile.family == "firefox":
+        bm_file = profile.file("places.sqlite")
+        key = ctx.key("firefox", prof, "bookmark")
+        if not bm_file or ctx.unchanged(key, bm_file): return
+        con = ctx.connect(bm_file)
+        if not con: return
+        try:
+            cond, params = ctx.since(key, "moz_places")
+            delta, dparams = ctx.delta(key, "moz_places")
+            sql = f"SELECT url, title, {delta} FROM moz_places{utils.where(['title IS NOT NULL', cond])}"
+            for url, title, tag in utils.query(con, sql, dparams + params):
+                yield utils.Row(
+                    browser="firefox", artifact="bookmark",
+                    profile=str(prof), url=url, title=title,
+                    visit_count=None, visit_time_utc=None, extra=tag
+                )
+            ctx.advance(key, con, "moz_places")
+        except Exception as e:
+            utils.log_line(f"Error bookmarks firefox {prof}: {e}")
+        finally:
+            con.close()
@@ -0,0 +1,256 @@
+import io, sys, json, zlib, struct
+try:
+    import lzma
+except ImportError:   # Python built without liblzma: fall back to zlib
+    lzma = None
+from array import array
+from datetime import datetime, timedelta
+from pathlib import Path
+from . import utils
+
+# Frostveil columnar format (.fvc): a compact, typed, column-oriented file.
+#
+#   "FVC1" | row group column chunks ... | dictionaries ... | footer JSON | uint32 footer size | "FVC1"
+#
+# Rows are buffered into row groups and each column of a group is written as
+# its own compressed chunk (xz at its fastest preset, or zlib), so a reader
+# seeks straight to the columns it needs. Run metadata is constant per file
+# and lives in the footer only. browser, artifact and profile are
+# dictionary-encoded (uint32 codes), URLs are split into a dictionary-encoded
+# scheme://host prefix and the remainder, timestamps are int64 microseconds
+# since the Unix epoch stored as deltas (table order roughly follows
+# insertion time), and missing values are a sentinel. Dictionaries grow as
+# rows stream in (codes never change) and are written once, after the last
+# row group. Little-endian.
+
+MAGIC = b"FVC1"
+VERSION = 1
+ROW_GROUP = 65536
+CODEC = "xz" if lzma else "zlib"
+CODECS = {
+    "xz": (lambda data: lzma.compress(data, preset=1), lambda blob: lzma.decompress(blob)),
+    "zlib": (lambda data: zlib.compress(data, 6), zlib.decompress),
+}
+NULL_LEN = 0xFFFFFFFF
+NULL_INT = -(1 << 63)
+EPOCH = datetime(1970, 1, 1)
+US = timedelta(microseconds=1)
+
+ENCODINGS = {"browser": "dict", "artifact": "dict", "profile": "dict", "url": "url", "title": "string",
+             "visit_count": "int64", "visit_time_utc": "timestamp_us", "extra": "string",
+             "kind": "dict", "host": "dict"}   # any other column is a plain string
+
+# ---- Encoding ----
+def _le(a):
+    if sys.byteorder == "big":
+        a.byteswap()
+    return a.tobytes()
+
+def encode_strings(values):
+    """uint32 byte lengths (NULL_LEN for None) followed by the concatenated UTF-8."""
+    data = [b"" if v is None else str(v).encode("utf-8") for v in values]
+    lengths = array("I", [NULL_LEN if v is None else len(b) for v, b in zip(values, data)])
+    return _le(lengths) + b"".join(data)
+
+def encode_codes(values, dictionary):
+    return _le(array("I", [dictionary.setdefault(v, len(dictionary)) for v in values]))
+
+def encode_ints(values):
+    return _le(array("q", [NULL_INT if v is None else int(v) for v in values]))
+
+def to_us(value):
+    return None if not value else (datetime.fromisoformat(value) - EPOCH) // US
+
+def encode_deltas(values):
+    """int64 differences to the previous non-null value (None stays NULL_INT)."""
+    out, prev = array("q"), 0
+    for v in values:
+        if v is None:
+            out.append(NULL_INT)
+        else:
+            out.append(v - prev)
+            prev = v
+    return _le(out)
+
+def split_url(url):
+    """("scheme://host", rest) so the repetitive prefix can be dictionary-encoded."""
+    if url is None:
+        return "", None
+    i = url.find("://")
+    if i < 0:
+        return "", url
+    j = url.find("/", i + 3)
+    if j < 0:
+        return url, ""
+    return url[:j], url[j:]
+
+class ColumnarSink:
+    """Writes rows as row groups of compressed column chunks. compress is ignored (chunks are always compressed)."""
+    digest = None
+
+    def __init__(self, path, meta, compress=False, columns=utils.COLUMNS):
+        self.path = Path(path)
+        self.meta = dict(meta)
+        self.columns = list(columns)
+        self.raw = io.BufferedWriter(utils.HashingFile(path), buffer_size=1024 * 1024)
+        self.raw.write(MAGIC)
+        self.offset = len(MAGIC)
+        self.pending, self.groups, self.rows = [], [], 0
+        self.compress = CODECS[CODEC][0]
+        self.dicts = {}
+
+    def chunk(self, data):
+        """Compress and append data; returns its [offset, length]."""
+        blob = self.compress(data)
+        span = [self.offset, len(blob)]
+        self.raw.write(blob)
+        self.offset += len(blob)
+        return span
+
+    def write(self, row):
+        self.pending.append(row)
+        if len(self.pending) >= ROW_GROUP:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        chunks = {}
+        for name, values in zip(self.columns, zip(*self.pending)):
+            enc = ENCODINGS.get(name, "string")
+            if enc == "dict":
+                chunks[name] = self.chunk(encode_codes(values, self.dicts.setdefault(name, {})))
+            elif enc == "url":
+                hosts, rests = zip(*map(split_url, values))
+                chunks[f"{name}.host"] = self.chunk(encode_codes(hosts, self.dicts.setdefault(f"{name}.host", {})))
+                chunks[f"{name}.rest"] = self.chunk(encode_strings(rests))
+            elif enc == "int64":
+                chunks[name] = self.chunk(encode_ints(values))
+            elif enc == "timestamp_us":
+                chunks[name] = self.chunk(encode_deltas(map(to_us, values)))
+            else:
+                chunks[name] = self.chunk(encode_strings(values))
+        self.groups.append({"rows": len(self.pending), "chunks": chunks})
+        self.rows += len(self.pending)
+        self.pending = []
+
+    def close(self):
+        self.flush()
+        dictionaries = {name: self.chunk(encode_strings(list(d))) + [len(d)] for name, d in self.dicts.items()}
+        columns = [{"name": k, "encoding": "constant"} for k in self.meta]
+        columns += [{"name": c, "encoding": ENCODINGS.get(c, "string")} for c in self.columns]
+        footer = json.dumps({"version": VERSION, "codec": CODEC, "rows": self.rows, "metadata": self.meta, "columns": columns,
+                             "dictionaries": dictionaries, "row_groups": self.groups}).encode("utf-8")
+        self.raw.write(footer + struct.pack("<I", len(footer)) + MAGIC)
+        self.raw.close()
+        self.digest = self.raw.raw.hexdigest()
+
+# ---- Reading ----
+
+def _array(code, data):
+    a = array(code)
+    a.frombytes(data)
+    if sys.byteorder == "big":
+        a.byteswap()
+    return a
+
+def decode_strings(data, n):
+    lengths = _array("I", data[:4 * n])
+    out, pos, body = [], 4 * n, memoryview(data)
+    for ln in lengths:
+        if ln == NULL_LEN:
+            out.append(None)
+        else:
+            out.append(str(body[pos:pos + ln], "utf-8"))
+            pos += ln
+    return out
+
+def decode_deltas(a):
+    out, prev = [], 0
+    for d in a:
+        if d == NULL_INT:
+            out.append(None)
+        else:
+            prev += d
+            out.append((EPOCH + prev * US).isoformat())
+    return out
+
+def read_footer(f):
+    f.seek(-8, io.SEEK_END)
+    size, magic = struct.unpack("<I4s", f.read(8))
+    if magic != MAGIC:
+        raise ValueError("not a Frostveil columnar file")
+    f.seek(-8 - size, io.SEEK_END)
+    return json.loads(f.read(size))
+
+def iter_row_groups(path, columns=None):
+    """Yield {column: [values]} per row group, decoding only the requested columns."""
+    with open(path, "rb") as f:
+        footer = read_footer(f)
+        if footer["codec"] == "xz" and lzma is None:
+            raise ValueError("file is xz-compressed but this Python has no lzma module")
+        decompress = CODECS[footer["codec"]][1]
+
+        def blob(span):
+            f.seek(span[0])
+            return decompress(f.read(span[1]))
+
+        encodings = {c["name"]: c["encoding"] for c in footer["columns"]}
+        names = list(columns or encodings)
+        for name in names:
+            if name not in encodings:
+                raise ValueError(f"unknown column {name!r}; file has {', '.join(encodings)}")
+        dicts = {}
+        for name in names:
+            key = f"{name}.host" if encodings[name] == "url" else name
+            if encodings[name] in ("dict", "url"):
+                off, ln, count = footer["dictionaries"][key]
+                dicts[name] = decode_strings(blob((off, ln)), count)
+        for group in footer["row_groups"]:
+            n, chunks, out = group["rows"], group["chunks"], {}
+            for name in names:
+                enc = encodings[name]
+                if enc == "constant":
+                    out[name] = [footer["metadata"][name]] * n
+                elif enc == "dict":
+                    d = dicts[name]
+                    out[name] = [d[c] for c in _array("I", blob(chunks[name]))]
+                elif enc == "url":
+                    d = dicts[name]
+                    hosts = _array("I", blob(chunks[f"{name}.host"]))
+                    rests = decode_strings(blob(chunks[f"{name}.rest"]), n)
+                    out[name] = [None if r is None else d[h] + r for h, r in zip(hosts, rests)]
+                elif enc == "string":
+                    out[name] = decode_strings(blob(chunks[name]), n)
+                elif enc == "int64":
+                    out[name] = [None if v == NULL_INT else v for v in _array("q", blob(chunks[name]))]
+                elif enc == "timestamp_us":
+                    out[name] = decode_deltas(_array("q", blob(chunks[name])))
+            yield out
+
+def read_columns(path, columns=None):
+    """{column: [values]} for the whole file."""
+    result = {}
+    for group in iter_row_groups(path, columns):
+        for name, values in group.items():
+            result.setdefault(name, []).extend(values)
+    return result
+
+def iter_rows(path, columns=None):
+    """Rows as dicts (same keys and values as the JSON outputs)."""
+    for group in iter_row_groups(path, columns):
+        names = list(group)
+        for values in zip(*group.values()):
+            yield dict(zip(names, values))
+
+if __name__ == "__main__":
+    # python -m modules.columnar FILE [COLUMN ...]  -> CSV on stdout
+    import csv
+    cols = sys.argv[2:] or None
+    w = csv.writer(sys.stdout)
+    header = False
+    for group in iter_row_groups(sys.argv[1], cols):
+        if not header:
+            w.writerow(group)
+            header = True
+        w.writerows(zip(*group.values()))
@@ -0,0 +1,92 @@
+import io, os, gzip, threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+try:   # optional zstd backend
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Block-parallel compression for --compress (pigz-style). The output stream is
+# cut into fixed-size blocks, each block is compressed on a thread pool (zlib
+# and zstandard release the GIL) and written, in order, as a complete gzip
+# member or zstd frame. Concatenated members/frames are a standard stream that
+# gzip/zcat/zstd and Python's gzip module read as one file. Members carry no
+# name or mtime, so the same rows always compress to the same bytes.
+
+CODECS = ("gzip", "zstd")
+LEVELS = {"gzip": range(0, 10), "zstd": range(1, 23)}
+DEFAULT_LEVEL = {"gzip": 6, "zstd": 3}
+BLOCK = 1024 * 1024
+
+class Options:
+    def __init__(self, codec="gzip", level=None, threads=None, block=BLOCK):
+        self.codec = codec
+        self.level = DEFAULT_LEVEL[codec] if level is None else level
+        self.threads = max(1, threads or os.cpu_count() or 1)
+        self.block = block
+
+def available(codec):
+    return codec == "gzip" or zstandard is not None
+
+def _gzip_member(data, level):
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+_zstd = threading.local()
+
+def _zstd_frame(data, level):
+    c = getattr(_zstd, "compressors", None)
+    if c is None:
+        c = _zstd.compressors = {}
+    if level not in c:   # a ZstdCompressor must not be shared between threads
+        c[level] = zstandard.ZstdCompressor(level=level)
+    return c[level].compress(data)
+
+class ParallelWriter(io.RawIOBase):
+    """
+    Writable binary stream compressing into raw. At most 2 x threads blocks
+    are in flight, which bounds memory. Like GzipFile, close() leaves raw open.
+    """
+    def __init__(self, raw, options=None):
+        self.raw = raw
+        self.opts = options or Options()
+        if not available(self.opts.codec):
+            raise RuntimeError("zstd compression needs the 'zstandard' package")
+        self.fn = _zstd_frame if self.opts.codec == "zstd" else _gzip_member
+        self.pool = ThreadPoolExecutor(max_workers=self.opts.threads, thread_name_prefix="compress")
+        self.pending = deque()
+        self.buf = bytearray()
+        self.blocks = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        n = memoryview(b).nbytes
+        self.buf += b
+        while len(self.buf) >= self.opts.block:
+            self._submit(bytes(self.buf[:self.opts.block]))
+            del self.buf[:self.opts.block]
+        return n
+
+    def _submit(self, data):
+        self.pending.append(self.pool.submit(self.fn, data, self.opts.level))
+        while len(self.pending) > 2 * self.opts.threads:
+            self._drain()
+
+    def _drain(self):
+        self.raw.write(self.pending.popleft().result())
+        self.blocks += 1
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self.buf or not (self.pending or self.blocks):   # an empty stream is still one valid member
+                self._submit(bytes(self.buf))
+                self.buf.clear()
+            while self.pending:
+                self._drain()
+        finally:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+            super().close()
@@ -0,0 +1,100 @@
+import sqlite3
+from pathlib import Path
+from . import utils, filters as filtering
+
+ACQUIRE_MODES = ("copy", "direct")
+
+class RunContext:
+    """State shared by every extractor during one acquisition run."""
+    def __init__(self, meta, acquire="copy", state=None, visits=False, filters=None, recover=False, hash_cache=None):
+        self.meta = meta
+        self.acquire = acquire
+        self.recover = recover  # also carve deleted records (recovery module)
+        self.filters = filters if filters is not None else filtering.Filters()   # pushed into the extractors' SQL
+        self.visits = visits  # history: one row per visit instead of per URL
+        self.state = state  # state.DeltaState when running as a delta against a baseline
+        self.sources = utils.SourceHashes(hash_cache)   # SHA256 of every source file acquired
+        if state is not None:
+            state.digest = self.sources.digest   # marks reuse the run's source hashes
+        self.snapshots = utils.SnapshotCache(self.sources)
+        self.methods = {}   # source path -> "direct" | "copy"
+        self.extensions = {}   # (extension id, version) -> parsed manifest fields, shared by all profiles
+
+    def snapshot(self, path: Path) -> Path:
+        """Local copy of a source file, taken once per run and shared by all extractors."""
+        return self.snapshots.get(path)
+
+    def connect(self, path: Path):
+        """
+        Open a source database for reading. In "direct" mode the file is opened
+        in place (read-only, immutable); a locked file falls back to a copy.
+        Returns None when the source is missing or cannot be acquired.
+        """
+        if self.acquire == "direct":
+            con = utils.open_immutable(path)
+            if con:
+                self.methods[str(path)] = "direct"
+                return con
+        tmp = self.snapshot(path)
+        if not tmp:
+            return None
+        self.methods[str(path)] = "copy"
+        # Read-only, so closing it never checkpoints the snapshot's -wal away
+        # (the recovery module carves it); a hot -journal needs a writable open
+        try:
+            con = sqlite3.connect(f"{tmp.absolute().as_uri()}?mode=ro", uri=True)
+            con.execute("SELECT count(*) FROM sqlite_master").fetchone()
+        except sqlite3.Error:
+            con = sqlite3.connect(str(tmp))
+        return utils.tune_connection(con)
+
+    # ---- Delta acquisition (no-ops unless a state file is in use) ----
+    def key(self, browser, profile, artifact):
+        return f"{browser}|{profile}|{artifact}"
+
+    def unchanged(self, key, path: Path):
+        """
+        True if path is unchanged since the baseline run, so key can be skipped.
+        Every extractor asks before reading a source, so other sources are
+        registered here for hashing.
+        """
+        if self.state is None or not self.state.unchanged(key, path):
+            self.sources.want(path)
+            return False
+        utils.log_line(f"Unchanged since baseline, skipping {key}")
+        return True
+
+    def since(self, key, table, time_col=None):
+        """SQL condition (or None) and params selecting rows added, or touched, after the baseline."""
+        mark = self.state.since(key) if self.state else None
+        if not mark:
+            return None, ()
+        if time_col:
+            return f"({table}.rowid > ? OR {time_col} > ?)", (mark["rowid"], mark["time"])
+        return f"{table}.rowid > ?", (mark["rowid"],)
+
+    def delta(self, key, table):
+        """
+        SQL expression (and params) for the row's delta token: delta=new past the
+        baseline rowid mark, delta=updated before it (picked up by its time mark).
+        '' outside delta runs and on the first one, which exports everything.
+        """
+        if self.state is None or not self.state.baseline:
+            return "''", ()
+        mark = self.state.since(key)
+        if not mark:
+            return "'delta=new'", ()
+        return f"CASE WHEN {table}.rowid > ? THEN 'delta=new' ELSE 'delta=updated' END", (mark["rowid"],)
+
+    def advance(self, key, con=None, table=None, time_col=None):
+        """Move the marks for key to the end of what was just read."""
+        if self.state is None:
+            return
+        rowid = time = None
+        if con is not None:
+            rowid, time = con.execute(
+                f"SELECT max(rowid), {f'max({time_col})' if time_col else 'NULL'} FROM {table}").fetchone()
+        self.state.advance(key, rowid, time)
+
+    def close(self):
+        self.snapshots.cleanup()
@@ -1,46 +1,53 @@
-import sqlite3
-from pathlib import Path
 from . import utils
 
-def extract(browser, path: Path, meta):
-    rows = []
-    if browser in ["chrome","edge"]:
-        ck = path.parent / "Cookies"
-        tmp = utils.safe_copy(ck)
-        if not tmp: return rows
+def extract(profile, ctx):
+    browser, prof = profile.browser, profile.path
+    if profile.family == "chromium":
+        ck = profile.file("Cookies")
+        key = ctx.key(browser, prof, "cookie")
+        if not ck or ctx.unchanged(key, ck): return
+        con = ctx.connect(ck)
+        if not con: return
         try:
-            con = sqlite3.connect(str(tmp))
-            cur = con.cursor()
-            cur.execute("SELECT host_key, name, value, last_access_utc FROM cookies")
-            for host, name, val, ts in cur.fetchall():
+            cond, params = ctx.since(key, "cookies", "last_access_utc")
+            filt, fparams = ctx.filters.sql("last_access_utc", "webkit", "host_key")
+            delta, dparams = ctx.delta(key, "cookies")
+            sql = (f"SELECT host_key, name, value, {utils.sql_utc_from_webkit('last_access_utc')}, {delta} "
+                   f"FROM cookies{utils.where([cond, filt])}")
+            for host, name, val, ts, tag in utils.query(con, sql, dparams + params + fparams):
                 # Chromium often encrypts values, here we just mark them
                 if val and val.startswith("v10"): 
                     val = "<encrypted>"
-                rows.append({
-                    **meta, "browser": browser, "artifact": "cookie",
-                    "profile": str(path.parent), "url": host, "title": name,
-                    "visit_count": None, "visit_time_utc": utils.utc_from_webkit(ts), "extra": f"value={val}"
-                })
-            con.close()
+                yield utils.Row(
+                    browser=browser, artifact="cookie",
+                    profile=str(prof), url=host, title=name,
+                    visit_count=None, visit_time_utc=ts, extra=utils.extra(f"value={val}", tag)
+                )
+            ctx.advance(key, con, "cookies", "last_access_utc")
         except Exception as e:
             utils.log_line(f"Error cookies {browser}: {e}")
-    elif browser=="firefox":
-        profs = path.glob("*.default*") if path.is_dir() else []
-        for prof in profs:
-            ck = prof / "cookies.sqlite"
-            tmp = utils.safe_copy(ck)
-            if not tmp: continue
-            try:
-                con = sqlite3.connect(str(tmp))
-                cur = con.cursor()
-                cur.execute("SELECT host, name, value, lastAccessed FROM moz_cookies")
-                for host, name, val, ts in cur.fetchall():
-                    rows.append({
-                        **meta, "browser": "firefox", "artifact": "cookie",
-                        "profile": str(prof), "url": host, "title": name,
-                        "visit_count": None, "visit_time_utc": utils.utc_from_unix(ts), "extra": f"value={val}"
-                    })
-                con.close()
-            except Exception as e:
-                utils.log_line(f"Error cookies firefox {prof}: {e}")
-    return rows
+        finally:
+            con.close()
+    elif profile.family == "firefox":
+        ck = profile.file("cookies.sqlite")
+        key = ctx.key("firefox", prof, "cookie")
+        if not ck or ctx.unchanged(key, ck): return
+        con = ctx.connect(ck)
+        if not con: return
+        try:
+            cond, params = ctx.since(key, "moz_cookies", "lastAccessed")
+            filt, fparams = ctx.filters.sql("lastAccessed", "unix", "host")
+            delta, dparams = ctx.delta(key, "moz_cookies")
+            sql = (f"SELECT host, name, value, {utils.sql_utc_from_unix('lastAccessed')}, {delta} "
+                   f"FROM moz_cookies{utils.where([cond, filt])}")
+            for host, name, val, ts, tag in utils.query(con, sql, dparams + params + fparams):
+                yield utils.Row(
+                    browser="firefox", artifact="cookie",
+                    profile=str(prof), url=host, title=name,
+                    visit_count=None, visit_time_utc=ts, extra=utils.extra(f"value={val}", tag)
+                )
+            ctx.advance(key, con, "moz_cookies", "lastAccessed")
+        except Exception as e:
+            utils.log_line(f"Error cookies firefox {prof}: {e}")
+        finally:
+            con.close()
@@ -0,0 +1,211 @@
+import os, json, fnmatch
+from dataclasses import dataclass, field
+from pathlib import Path
+from . import utils
+
+# Profile inventory, built in a single pass. Every browser location is listed
+# once with os.scandir and each artifact file the extractors read is resolved
+# up front, so extractors never glob or probe the filesystem themselves. The
+# walk remembers the mtime of every directory it relied on; a cached inventory
+# is reused for as long as none of them changed.
+
+# Browser locations relative to a user home, per OS: (browser, path)
+BROWSER_LAYOUTS = {
+    "windows": (
+        ("chrome", "AppData/Local/Google/Chrome/User Data"),
+        ("edge", "AppData/Local/Microsoft/Edge/User Data"),
+        ("firefox", "AppData/Roaming/Mozilla/Firefox/Profiles"),
+    ),
+    "darwin": (
+        ("chrome", "Library/Application Support/Google/Chrome"),
+        ("edge", "Library/Application Support/Microsoft Edge"),
+        ("safari", "Library/Safari/History.db"),
+        ("firefox", "Library/Application Support/Firefox/Profiles"),
+    ),
+    "linux": (
+        ("chrome", ".config/google-chrome"),
+        ("edge", ".config/microsoft-edge"),
+        ("firefox", ".mozilla/firefox"),
+    ),
+}
+
+FAMILIES = {"chrome": "chromium", "edge": "chromium", "firefox": "firefox", "safari": "safari"}
+
+# Artifact files (or directories) resolved for each profile
+FILES = {
+    "chromium": ("History", "Cookies", "Bookmarks", "Sessions", "Extensions",
+                 "Current Session", "Last Session", "Current Tabs", "Last Tabs"),
+    "firefox": ("places.sqlite", "cookies.sqlite", "downloads.sqlite", "formhistory.sqlite",
+                "sessionstore.jsonlz4", "extensions"),
+    "safari": ("History.db",),
+}
+
+FIREFOX_PROFILES = "*.default*"
+# Chromium SNSS files: Sessions/Session_*, Sessions/Tabs_* and the older files in the profile root
+SNSS_PREFIXES = ("Session_", "Tabs_")
+SNSS_LEGACY = ("Current Session", "Last Session", "Current Tabs", "Last Tabs")
+CACHE_VERSION = 2
+
+@dataclass
+class Profile:
+    browser: str
+    path: Path
+    files: dict = field(default_factory=dict)        # artifact file name -> Path (only those present)
+    extensions: list = field(default_factory=list)   # manifest.json per Chromium extension, .xpi per Firefox one
+    sessions: list = field(default_factory=list)     # Chromium SNSS session files
+
+    @property
+    def family(self):
+        return FAMILIES[self.browser]
+
+    def file(self, name):
+        return self.files.get(name)
+
+    def to_json(self):
+        return {"browser": self.browser, "path": str(self.path),
+                "files": {k: str(v) for k, v in self.files.items()},
+                "extensions": [str(x) for x in self.extensions], "sessions": [str(x) for x in self.sessions]}
+
+    @classmethod
+    def from_json(cls, d):
+        return cls(d["browser"], Path(d["path"]), {k: Path(v) for k, v in d["files"].items()},
+                   [Path(x) for x in d["extensions"]], [Path(x) for x in d["sessions"]])
+
+class Walker:
+    """os.scandir-based listing that records the mtime of every directory it looked at."""
+    def __init__(self):
+        self.dirs = {}
+
+    def stamp(self, path):
+        """Record the mtime of path, or of its nearest existing ancestor if it is missing."""
+        p = Path(path)
+        while True:
+            try:
+                self.dirs[str(p)] = os.stat(p).st_mtime_ns
+                return
+            except OSError:
+                if p.parent == p:
+                    return
+                p = p.parent
+
+    def exists(self, path):
+        try:
+            os.stat(path)
+            return True
+        except PermissionError:
+            utils.log_line(f"[ACCESS DENIED] Could not access {path}")
+            return False
+        except OSError:
+            self.stamp(Path(path).parent)   # its creation would change the parent's mtime
+            return False
+
+    def list(self, path):
+        """{name: DirEntry} for path; empty if it is missing or unreadable."""
+        try:
+            with os.scandir(path) as it:
+                entries = {e.name: e for e in it}
+            self.dirs[str(path)] = os.stat(path).st_mtime_ns
+            return entries
+        except PermissionError:
+            utils.log_line(f"[ACCESS DENIED] Could not list {path}")
+        except OSError:
+            self.stamp(path)
+        return {}
+
+    def profile(self, browser, path):
+        family = FAMILIES[browser]
+        entries = self.list(path)
+        prof = Profile(browser, Path(path), {n: Path(entries[n].path) for n in FILES[family] if n in entries})
+        if family == "chromium":
+            if "Extensions" in entries:
+                for ext_id in sorted(self.list(prof.files["Extensions"]).values(), key=lambda e: e.name):
+                    if not ext_id.is_dir():
+                        continue
+                    for ver in sorted(self.list(ext_id.path).values(), key=lambda e: e.name):
+                        manifest = Path(ver.path) / "manifest.json"
+                        if ver.is_dir() and self.exists(manifest):
+                            prof.extensions.append(manifest)
+            if "Sessions" in entries:
+                prof.sessions = sorted(Path(e.path) for e in self.list(prof.files["Sessions"]).values()
+                                       if e.name.startswith(SNSS_PREFIXES) and e.is_file())
+            prof.sessions += [prof.files[n] for n in SNSS_LEGACY if n in prof.files]
+        elif family == "firefox" and "extensions" in entries:
+            prof.extensions = sorted(Path(e.path) for e in self.list(prof.files["extensions"]).values()
+                                     if e.name.endswith(".xpi"))
+        return prof
+
+    def browser(self, browser, base):
+        """Profiles of one browser installation (base as listed in BROWSER_LAYOUTS)."""
+        family = FAMILIES[browser]
+        if family == "safari":
+            return [Profile(browser, base.parent, {base.name: base})] if self.exists(base) else []
+        profiles = []
+        for e in sorted(self.list(base).values(), key=lambda e: e.name):
+            if not e.is_dir():
+                continue
+            if family == "chromium":
+                # A Chromium user-data subdirectory is a profile if it holds a History database
+                if self.exists(Path(e.path) / "History"):
+                    profiles.append(self.profile(browser, e.path))
+            elif fnmatch.fnmatch(e.name, FIREFOX_PROFILES):
+                profiles.append(self.profile(browser, e.path))
+        return profiles
+
+def discover(root=None):
+    """
+    Walk every user home (of the live host, or under an evidence root) once.
+    Returns (profiles grouped by browser, {directory: mtime_ns} the result depends on).
+    """
+    layouts = [BROWSER_LAYOUTS[utils.host_os()]] if root is None else list(BROWSER_LAYOUTS.values())
+    walker = Walker()
+    found = {}
+    for home in utils.find_all_user_homes(root):
+        walker.stamp(home.parent)   # a new user home changes its parent
+        try:
+            for layout in layouts:
+                for browser, rel in layout:
+                    for prof in walker.browser(browser, home / rel):
+                        found.setdefault(browser, []).append(prof)
+        except PermissionError:
+            utils.log_line(f"[ACCESS DENIED] Skipping entire home directory {home}")
+        except Exception as e:
+            utils.log_line(f"[ERROR] Unexpected error scanning {home}: {e}")
+    return [p for profs in found.values() for p in profs], walker.dirs
+
+def load_cache(path, root=None):
+    """Cached inventory, or None if there is none for this root or any directory it used has changed."""
+    try:
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if data.get("version") != CACHE_VERSION or data.get("root") != (str(root) if root else None) \
+            or data.get("host_os") != utils.host_os():
+        return None
+    for d, mtime in data["dirs"].items():
+        try:
+            if os.stat(d).st_mtime_ns != mtime:
+                return None
+        except OSError:
+            return None
+    return [Profile.from_json(p) for p in data["profiles"]]
+
+def save_cache(path, root, profiles, dirs):
+    data = {"version": CACHE_VERSION, "root": str(root) if root else None, "host_os": utils.host_os(),
+            "dirs": dict(sorted(dirs.items())), "profiles": [p.to_json() for p in profiles]}
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(data, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+def inventory(root=None, cache=None):
+    """Profile inventory for this run, reusing the cache file when it is still valid. Returns (profiles, cached)."""
+    if cache:
+        profiles = load_cache(cache, root)
+        if profiles is not None:
+            utils.log_line(f"Discovery cache {cache} is current", profiles=len(profiles))
+            return profiles, True
+    profiles, dirs = discover(root)
+    utils.log_line("Discovery complete", profiles=len(profiles), dirs=len(dirs))
+    if cache:
+        save_cache(cache, root, profiles, dirs)
+    return profiles, False
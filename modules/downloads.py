@@ -1,42 +1,51 @@
-import sqlite3
-from pathlib import Path
 from . import utils
 
-def extract(browser, path: Path, meta):
-    rows = []
-    if browser in ["chrome","edge"]:
-        tmp = utils.safe_copy(path)
-        if not tmp: return rows
+def extract(profile, ctx):
+    browser, prof = profile.browser, profile.path
+    if profile.family == "chromium":
+        db = profile.file("History")
+        key = ctx.key(browser, prof, "download")
+        if not db or ctx.unchanged(key, db): return
+        con = ctx.connect(db)
+        if not con: return
         try:
-            con = sqlite3.connect(str(tmp))
-            cur = con.cursor()
-            cur.execute("SELECT tab_url, target_path, start_time FROM downloads JOIN downloads_url_chains ON downloads.id=downloads_url_chains.id")
-            for url, target, ts in cur.fetchall():
-                rows.append({
-                    **meta, "browser": browser, "artifact": "download",
-                    "profile": str(path.parent), "url": url, "title": target,
-                    "visit_count": None, "visit_time_utc": utils.utc_from_webkit(ts), "extra": ""
-                })
-            con.close()
+            cond, params = ctx.since(key, "downloads")
+            filt, fparams = ctx.filters.sql("start_time", "webkit", "tab_url")
+            delta, dparams = ctx.delta(key, "downloads")
+            sql = (f"SELECT tab_url, target_path, {utils.sql_utc_from_webkit('start_time')}, {delta} "
+                   "FROM downloads JOIN downloads_url_chains ON downloads.id=downloads_url_chains.id"
+                   f"{utils.where([cond, filt])}")
+            for url, target, ts, tag in utils.query(con, sql, dparams + params + fparams):
+                yield utils.Row(
+                    browser=browser, artifact="download",
+                    profile=str(prof), url=url, title=target,
+                    visit_count=None, visit_time_utc=ts, extra=tag
+                )
+            ctx.advance(key, con, "downloads")
         except Exception as e:
             utils.log_line(f"Error downloads {browser}: {e}")
-    elif browser=="firefox":
-        profs = path.glob("*.default*") if path.is_dir() else []
-        for prof in profs:
-            dl = prof / "downloads.sqlite"
-            tmp = utils.safe_copy(dl)
-            if not tmp: continue
-            try:
-                con = sqlite3.connect(str(tmp))
-                cur = con.cursor()
-                cur.execute("SELECT source, target, startTime FROM moz_downloads")
-                for src, tgt, ts in cur.fetchall():
-                    rows.append({
-                        **meta, "browser": "firefox", "artifact": "download",
-                        "profile": str(prof), "url": src, "title": tgt,
-                        "visit_count": None, "visit_time_utc": utils.utc_from_unix(ts), "extra": ""
-                    })
-                con.close()
-            except Exception as e:
-                utils.log_line(f"Error downloads firefox {prof}: {e}")
-    return rows
+        finally:
+            con.close()
+    elif profile.family == "firefox":
+        dl = profile.file("downloads.sqlite")
+        key = ctx.key("firefox", prof, "download")
+        if not dl or ctx.unchanged(key, dl): return
+        con = ctx.connect(dl)
+        if not con: return
+        try:
+            cond, params = ctx.since(key, "moz_downloads")
+            filt, fparams = ctx.filters.sql("startTime", "unix", "source")
+            delta, dparams = ctx.delta(key, "moz_downloads")
+            sql = (f"SELECT source, target, {utils.sql_utc_from_unix('startTime')}, {delta} "
+                   f"FROM moz_downloads{utils.where([cond, filt])}")
+            for src, tgt, ts, tag in utils.query(con, sql, dparams + params + fparams):
+                yield utils.Row(
+                    browser="firefox", artifact="download",
+                    profile=str(prof), url=src, title=tgt,
+                    visit_count=None, visit_time_utc=ts, extra=tag
+                )
+            ctx.advance(key, con, "moz_downloads")
+        except Exception as e:
+            utils.log_line(f"Error downloads firefox {prof}: {e}")
+        finally:
+            con.close()
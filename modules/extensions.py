@@ -1,32 +1,67 @@
-from pathlib import Path
 from . import utils
 import json
+from concurrent.futures import ThreadPoolExecutor
 
-def extract(browser, path: Path, meta):
-    rows = []
-    if browser in ["chrome","edge"]:
-        extdir = path.parent / "Extensions"
-        if extdir.exists():
-            for ext in extdir.glob("*/*/manifest.json"):
-                try:
-                    data = json.loads(ext.read_text(encoding="utf-8"))
-                    rows.append({
-                        **meta, "browser": browser, "artifact": "extension",
-                        "profile": str(path.parent), "url": data.get("homepage_url",""),
-                        "title": data.get("name",""), "visit_count": None,
-                        "visit_time_utc": None, "extra": f"version={data.get('version','')}"
-                    })
-                except Exception as e:
-                    utils.log_line(f"Error extension {ext}: {e}")
-    elif browser=="firefox":
-        profs = path.glob("*.default*") if path.is_dir() else []
-        for prof in profs:
-            extdir = prof / "extensions"
-            if extdir.exists():
-                for xpi in extdir.glob("*.xpi"):
-                    rows.append({
-                        **meta, "browser": "firefox", "artifact": "extension",
-                        "profile": str(prof), "url": "", "title": xpi.name,
-                        "visit_count": None, "visit_time_utc": None, "extra": "xpi package"
-                    })
-    return rows
+MANIFEST_WORKERS = 8   # manifests are small files; reading them is mostly waiting on I/O
+
+def read_manifest(path):
+    """(homepage_url, name, version) from a Chromium extension manifest.json."""
+    data = json.loads(path.read_bytes())
+    return data.get("homepage_url", ""), data.get("name", ""), data.get("version", "")
+
+def _read(path):
+    try:
+        return read_manifest(path)
+    except Exception as e:
+        return e
+
+def parse_manifests(paths, cache):
+    """
+    {path: fields or exception}. Manifests are parsed on a thread pool, and
+    cache maps (extension id, version) to fields parsed earlier in the run,
+    so a profile with the same extensions as another one reads nothing.
+    """
+    ident = {p: (p.parent.parent.name, p.parent.name) for p in paths}
+    out = {p: cache[ident[p]] for p in paths if ident[p] in cache}
+    todo = [p for p in paths if p not in out]
+    if todo:
+        with ThreadPoolExecutor(max_workers=min(MANIFEST_WORKERS, len(todo)), thread_name_prefix="manifest") as pool:
+            for p, fields in zip(todo, pool.map(_read, todo)):
+                out[p] = fields
+                if not isinstance(fields, Exception):   # failures may be local to this profile
+                    cache.setdefault(ident[p], fields)
+    return out
+
+def extract(profile, ctx):
+    browser, prof = profile.browser, profile.path
+    if profile.family == "chromium":
+        keys = {}
+        for ext in profile.extensions:
+            key = ctx.key(browser, prof, f"extension:{ext.parent.parent.name}/{ext.parent.name}")
+            if not ctx.unchanged(key, ext):
+                keys[ext] = key
+        parsed = parse_manifests(list(keys), ctx.extensions)
+        for ext, key in keys.items():
+            fields = parsed[ext]
+            if isinstance(fields, Exception):
+                utils.log_line(f"Error extension {ext}: {fields}")
+                continue
+            homepage, name, version = fields
+            yield utils.Row(
+                browser=browser, artifact="extension",
+                profile=str(prof), url=homepage,
+                title=name, visit_count=None,
+                visit_time_utc=None, extra=f"version={version}"
+            )
+            ctx.advance(key)
+    elif profile.family == "firefox":
+        for xpi in profile.extensions:
+            key = ctx.key("firefox", prof, f"extension:{xpi.name}")
+            if ctx.unchanged(key, xpi):
+                continue
+            yield utils.Row(
+                browser="firefox", artifact="extension",
+                profile=str(prof), url="", title=xpi.name,
+                visit_count=None, visit_time_utc=None, extra="xpi package"
+            )
+            ctx.advance(key)
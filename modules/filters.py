@@ -0,0 +1,109 @@
+import fnmatch
+from datetime import datetime, timezone, timedelta
+from . import urlindex
+
+# Acquisition filters. Unselected browsers, profiles and extractor modules are
+# never run. Time and domain predicates are compiled into the extractors' SQL
+# (sql()), so SQLite skips non-matching rows, and every row is then checked
+# exactly (match()), which also covers the artifacts that are not SQL-backed.
+#
+#   filt = filters.Filters(browsers=["edge"], artifacts=["downloads"], domains=["example.com"],
+#                          start="2024-05-01", end="2024-05-08")
+#   ctx = context.RunContext(meta, filters=filt)
+#   rows = main.iter_rows(filt.profiles(profiles), filt.extractors(main.EXTRACTORS), ctx, errors)
+
+WEBKIT_EPOCH = datetime(1601, 1, 1)
+UNIX_EPOCH = datetime(1970, 1, 1)
+US = timedelta(microseconds=1)
+
+def parse_time(value):
+    """ISO 8601 date or time as a naive UTC datetime (offsets are converted, no offset means UTC)."""
+    if not value:
+        return None
+    t = datetime.fromisoformat(value.strip())
+    if t.tzinfo is not None:
+        t = t.astimezone(timezone.utc).replace(tzinfo=None)
+    return t
+
+def parse_domain(value):
+    """Bare, lowercased host from a domain, host or URL ("https://Example.com/x" -> "example.com")."""
+    kind, _, host = urlindex.normalize(value.strip())
+    if kind == "other" or not host:
+        raise ValueError(f"not a domain: {value!r}")
+    return host
+
+def like_escape(value):
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+class Filters:
+    """What to acquire; an empty Filters selects everything (and is falsy)."""
+    def __init__(self, browsers=None, artifacts=None, domains=None, start=None, end=None, profile_globs=None):
+        self.browsers = set(browsers or ())
+        self.artifacts = set(artifacts or ())
+        self.domains = [parse_domain(d) for d in domains or ()]
+        self.start, self.end = parse_time(start), parse_time(end)
+        self.profile_globs = list(profile_globs or ())
+        # rows hold naive ISO strings, so the window is compared in that form
+        self.start_iso = self.start.isoformat() if self.start else None
+        self.end_iso = self.end.isoformat() if self.end else None
+
+    def __bool__(self):
+        return bool(self.domains or self.start or self.end)   # rows need checking
+
+    def describe(self):
+        """The active filters, for the manifest."""
+        d = {"browsers": sorted(self.browsers), "artifacts": sorted(self.artifacts), "domains": self.domains,
+             "from": self.start_iso, "to": self.end_iso, "profile_globs": self.profile_globs}
+        return {k: v for k, v in d.items() if v}
+
+    # ---- Selection ----
+    def profiles(self, profiles):
+        def wanted(p):
+            if self.browsers and p.browser not in self.browsers:
+                return False
+            return not self.profile_globs or any(
+                fnmatch.fnmatch(str(p.path), g) or fnmatch.fnmatch(p.path.name, g) for g in self.profile_globs)
+        return [p for p in profiles if wanted(p)]
+
+    def extractors(self, extractors):
+        if not self.artifacts:
+            return list(extractors)
+        return [ex for ex in extractors if ex.__name__.rsplit(".", 1)[-1] in self.artifacts]
+
+    # ---- SQL pushdown ----
+    def sql(self, time_col=None, epoch="webkit", url_col=None):
+        """
+        (condition or None, params) for a query: time_col holds microseconds
+        since the webkit (1601) or unix epoch, url_col a URL or host. The
+        domain test is a LIKE prefilter; match() makes it exact.
+        """
+        conds, params = [], []
+        if time_col and (self.start or self.end):
+            base = WEBKIT_EPOCH if epoch == "webkit" else UNIX_EPOCH
+            # 0 means "no time" in these schemas, so the lower bound is at least 1
+            conds.append(f"{time_col} >= ?")
+            params.append(max(1, (self.start - base) // US) if self.start else 1)
+            if self.end:
+                conds.append(f"{time_col} < ?")
+                params.append((self.end - base) // US)
+        if url_col and self.domains:
+            conds.append("(" + " OR ".join(f"{url_col} LIKE ? ESCAPE '\\'" for _ in self.domains) + ")")
+            params.extend(f"%{like_escape(d)}%" for d in self.domains)
+        return (" AND ".join(conds) or None), tuple(params)
+
+    # ---- Exact row check ----
+    def match(self, row):
+        if self.start or self.end:
+            t = row.visit_time_utc
+            if not t or (self.start_iso and t < self.start_iso) or (self.end_iso and t >= self.end_iso):
+                return False
+        if self.domains:
+            if not row.url:
+                return False
+            host = urlindex.normalize(row.url)[2]
+            if not any(host == d or host.endswith("." + d) for d in self.domains):
+                return False
+        return True
+
+    def rows(self, rows):
+        return (r for r in rows if self.match(r))
@@ -1,67 +1,131 @@
-import sqlite3
-from pathlib import Path
 from . import utils
 
-def extract(browser, path: Path, meta):
+# Page transition names: Chromium core types (transition & 0xFF) and Firefox visit_type
+CHROMIUM_TRANSITIONS = ["link", "typed", "auto_bookmark", "auto_subframe", "manual_subframe", "generated",
+                        "auto_toplevel", "form_submit", "reload", "keyword", "keyword_generated"]
+FIREFOX_TRANSITIONS = {1: "link", 2: "typed", 3: "bookmark", 4: "embed", 5: "redirect_permanent",
+                       6: "redirect_temporary", 7: "download", 8: "framed_link", 9: "reload"}
+
+# Visit-level queries. The visits table drives the join (CROSS JOIN fixes the
+# loop order) and is walked along its time index, each visit picking up its
+# URL by primary key, so rows leave SQLite already in time order with no sort
+# and are fetched in batches: memory stays flat however many visits there are.
+CHROMIUM_VISITS = ("SELECT urls.url, urls.title, urls.visit_count, {ts}, visits.id, visits.from_visit, visits.transition, {delta} "
+                   "FROM visits CROSS JOIN urls ON urls.id = visits.url{where} ORDER BY visits.visit_time")
+FIREFOX_VISITS = ("SELECT moz_places.url, moz_places.title, moz_places.visit_count, {ts}, moz_historyvisits.id, "
+                  "moz_historyvisits.from_visit, moz_historyvisits.visit_type, {delta} "
+                  "FROM moz_historyvisits CROSS JOIN moz_places ON moz_places.id = moz_historyvisits.place_id{where} "
+                  "ORDER BY moz_historyvisits.visit_date")
+
+def transition_name(browser, value):
+    if value is None:
+        return ""
+    if browser == "firefox":
+        return FIREFOX_TRANSITIONS.get(value, str(value))
+    core = value & 0xFF
+    return CHROMIUM_TRANSITIONS[core] if core < len(CHROMIUM_TRANSITIONS) else str(core)
+
+def ts_sql(browser, col):
+    return utils.sql_utc_from_unix(col) if browser == "firefox" else utils.sql_utc_from_webkit(col)
+
+def extract_visits(ctx, con, key, browser, prof, sql, table, time_col, url_col):
+    """One row per visit (ctx.visits), newest last; visit_count is the URL's total."""
+    cond, params = ctx.since(key, table)   # visits are append-only: new rowids are new visits
+    filt, fparams = ctx.filters.sql(f"{table}.{time_col}", "unix" if browser == "firefox" else "webkit", url_col)
+    delta, dparams = ctx.delta(key, table)
+    sql = sql.format(ts=ts_sql(browser, f"{table}.{time_col}"), delta=delta, where=utils.where([cond, filt]))
+    for url, title, vc, ts, vid, src, tr, tag in utils.query(con, sql, dparams + params + fparams):
+        yield utils.Row(
+            browser=browser,
+            artifact="visit",
+            profile=str(prof),
+            url=url,
+            title=title or "",
+            visit_count=vc,
+            visit_time_utc=ts,
+            extra=utils.extra(f"visit_id={vid} from_visit={src or 0} transition={transition_name(browser, tr)}", tag)
+        )
+    ctx.advance(key, con, table, time_col)
+
+def extract(profile, ctx):
     """
-    Extract browsing history from Chrome, Edge, and Firefox.
-    Live records only (no deleted record carving).
+    Extract browsing history from Chrome, Edge, and Firefox: one row per URL,
+    or one per visit when ctx.visits is set.
+    Live records only; deleted ones are carved by the recovery module (--recover).
     """
-    rows = []
+    browser, prof = profile.browser, profile.path
 
     # ---- Chromium family (Chrome/Edge) ----
-    if browser in ["chrome", "edge"]:
-        tmp = utils.safe_copy(path)
-        if not tmp:
-            return rows
+    if profile.family == "chromium":
+        db = profile.file("History")
+        key = ctx.key(browser, prof, "visits" if ctx.visits else "history")
+        if not db or ctx.unchanged(key, db):
+            return
+        con = ctx.connect(db)
+        if not con:
+            return
         try:
-            con = sqlite3.connect(str(tmp))
-            cur = con.cursor()
-            cur.execute("SELECT url, title, visit_count, last_visit_time FROM urls")
-            for url, title, vc, ts in cur.fetchall():
-                rows.append({
-                    **meta,
-                    "browser": browser,
-                    "artifact": "history",
-                    "profile": str(path.parent),
-                    "url": url,
-                    "title": title or "",
-                    "visit_count": vc,
-                    "visit_time_utc": utils.utc_from_webkit(ts),
-                    "extra": ""
-                })
-            con.close()
-            utils.log_line(f"History extracted from {path}")
+            if ctx.visits:
+                yield from extract_visits(ctx, con, key, browser, prof, CHROMIUM_VISITS, "visits", "visit_time", "urls.url")
+                utils.log_line(f"History visits extracted from {db}")
+                return
+            cond, params = ctx.since(key, "urls", "last_visit_time")
+            filt, fparams = ctx.filters.sql("last_visit_time", "webkit", "url")
+            delta, dparams = ctx.delta(key, "urls")
+            sql = (f"SELECT url, title, visit_count, {utils.sql_utc_from_webkit('last_visit_time')}, {delta} "
+                   f"FROM urls{utils.where([cond, filt])}")
+            for url, title, vc, ts, tag in utils.query(con, sql, dparams + params + fparams):
+                yield utils.Row(
+                    browser=browser,
+                    artifact="history",
+                    profile=str(prof),
+                    url=url,
+                    title=title or "",
+                    visit_count=vc,
+                    visit_time_utc=ts,
+                    extra=tag
+                )
+            ctx.advance(key, con, "urls", "last_visit_time")
+            utils.log_line(f"History extracted from {db}")
         except Exception as e:
-            utils.log_line(f"Error history {browser} {path}: {e}")
+            utils.log_line(f"Error history {browser} {db}: {e}")
+        finally:
+            con.close()
 
     # ---- Firefox ----
-    elif browser == "firefox":
-        if path.is_dir():
-            for prof in path.glob("*.default*"):
-                db = prof / "places.sqlite"
-                tmp = utils.safe_copy(db)
-                if not tmp:
-                    continue
-                try:
-                    con = sqlite3.connect(str(tmp))
-                    cur = con.cursor()
-                    cur.execute("SELECT url, title, visit_count, last_visit_date FROM moz_places")
-                    for url, title, vc, ts in cur.fetchall():
-                        rows.append({
-                            **meta,
-                            "browser": "firefox",
-                            "artifact": "history",
-                            "profile": str(prof),
-                            "url": url,
-                            "title": title or "",
-                            "visit_count": vc,
-                            "visit_time_utc": utils.utc_from_unix(ts),
-                            "extra": ""
-                        })
-                    con.close()
-                    utils.log_line(f"History extracted from {db}")
-                except Exception as e:
-                    utils.log_line(f"Error history firefox {prof}: {e}")
-
-    return rows
+    elif profile.family == "firefox":
+        db = profile.file("places.sqlite")
+        key = ctx.key("firefox", prof, "visits" if ctx.visits else "history")
+        if not db or ctx.unchanged(key, db):
+            return
+        con = ctx.connect(db)
+        if not con:
+            return
+        try:
+            if ctx.visits:
+                yield from extract_visits(ctx, con, key, "firefox", prof, FIREFOX_VISITS, "moz_historyvisits", "visit_date",
+                                              "moz_places.url")
+                utils.log_line(f"History visits extracted from {db}")
+                return
+            cond, params = ctx.since(key, "moz_places", "last_visit_date")
+            filt, fparams = ctx.filters.sql("last_visit_date", "unix", "url")
+            delta, dparams = ctx.delta(key, "moz_places")
+            sql = (f"SELECT url, title, visit_count, {utils.sql_utc_from_unix('last_visit_date')}, {delta} "
+                   f"FROM moz_places{utils.where([cond, filt])}")
+            for url, title, vc, ts, tag in utils.query(con, sql, dparams + params + fparams):
+                yield utils.Row(
+                    browser="firefox",
+                    artifact="history",
+                    profile=str(prof),
+                    url=url,
+                    title=title or "",
+                    visit_count=vc,
+                    visit_time_utc=ts,
+                    extra=tag
+                )
+            ctx.advance(key, con, "moz_places", "last_visit_date")
+            utils.log_line(f"History extracted from {db}")
+        except Exception as e:
+            utils.log_line(f"Error history firefox {prof}: {e}")
+        finally:
+            con.close()
@@ -0,0 +1,143 @@
+import io, sys, time, threading, cProfile, pstats, tracemalloc
+from pathlib import Path
+
+# Per-stage instrumentation. Every (browser, profile, extractor) job is a stage;
+# we record the time spent inside the extractor itself (not in the writers
+# consuming its rows), the rows it produced, the bytes copied for it and the
+# process peak RSS when it finished. --profile additionally collects cProfile
+# and tracemalloc data for the whole run.
+
+_local = threading.local()
+
+# Before 3.12 cProfile only sees the thread that enabled it, so worker threads
+# get their own profiles. From 3.12 it is built on the process-wide
+# sys.monitoring: the run-wide profile covers every thread and a second
+# enabled profiler is an error.
+PER_THREAD_PROFILES = sys.version_info < (3, 12)
+
+def add_copied(nbytes):
+    """Attribute copied bytes to the stage running on this thread (if any)."""
+    stage = getattr(_local, "stage", None)
+    if stage is not None:
+        stage["bytes_copied"] += nbytes
+
+def peak_rss_mb():
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    except ImportError:
+        pass
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class PMC(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+        pmc = PMC()
+        pmc.cb = ctypes.sizeof(PMC)
+        proc = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(proc, ctypes.byref(pmc), pmc.cb):
+            return round(pmc.PeakWorkingSetSize / (1024 * 1024), 1)
+    except Exception:
+        pass
+    return None
+
+class Profiler:
+    def __init__(self, deep=False):
+        self.deep = deep
+        self.stages = {}
+        self.write_s = 0.0
+        self.hash_s = 0.0   # hashing the sources not hashed while copied
+        self.t0 = time.perf_counter()
+        self.lock = threading.Lock()
+        self.profiles = []
+        self.main_profile = None
+        if deep:
+            tracemalloc.start()
+            self.main_profile = cProfile.Profile()
+            self.main_profile.enable()
+
+    def track(self, idx, browser, profile, extractor, rows):
+        """Wrap an extractor's row generator, timing only the work done inside it."""
+        stage = {"browser": browser, "profile": str(profile), "extractor": extractor,
+                 "wall_s": 0.0, "rows": 0, "rows_per_s": None, "bytes_copied": 0, "peak_rss_mb": None}
+        with self.lock:
+            self.stages[idx] = stage
+        # Worker threads run one job at a time, so a per-job profile is exact;
+        # on the main thread the run-wide profile already covers the job
+        prof = collected = None
+        if self.deep and PER_THREAD_PROFILES and threading.current_thread() is not threading.main_thread():
+            prof = cProfile.Profile()
+        it = iter(rows)
+        try:
+            while True:
+                _local.stage = stage
+                if prof:
+                    try:
+                        prof.enable()
+                        collected = prof
+                    except Exception:   # another profiler is active: profiling must never cost rows
+                        prof = None
+                t = time.perf_counter()
+                try:
+                    row = next(it)
+                except StopIteration:
+                    break
+                finally:
+                    stage["wall_s"] += time.perf_counter() - t
+                    if prof: prof.disable()
+                    _local.stage = None
+                stage["rows"] += 1
+                yield row
+        finally:
+            stage["wall_s"] = round(stage["wall_s"], 6)
+            if stage["wall_s"]:
+                stage["rows_per_s"] = round(stage["rows"] / stage["wall_s"], 1)
+            stage["peak_rss_mb"] = peak_rss_mb()
+            if collected:
+                with self.lock:
+                    self.profiles.append(collected)
+
+    def report(self):
+        """Summary for the manifest (stages in job order)."""
+        stages = [self.stages[i] for i in sorted(self.stages)]
+        extract_s = sum(s["wall_s"] for s in stages)
+        return {
+            "total_s": round(time.perf_counter() - self.t0, 6),
+            "extract_s": round(extract_s, 6),
+            "write_s": round(self.write_s, 6),
+            "hash_s": round(self.hash_s, 6),
+            "rows": sum(s["rows"] for s in stages),
+            "bytes_copied": sum(s["bytes_copied"] for s in stages),
+            "peak_rss_mb": peak_rss_mb(),
+            "stages": stages,
+        }
+
+    def dump(self, out_dir="."):
+        """With --profile: write merged cProfile stats and the top tracemalloc sites. Returns the files."""
+        if not self.deep:
+            return []
+        self.main_profile.disable()
+        pstats_path, text_path = Path(out_dir) / "profile.pstats", Path(out_dir) / "profile.txt"
+        buf = io.StringIO()
+        stats = pstats.Stats(self.main_profile, stream=buf)
+        for prof in self.profiles:
+            try:
+                stats.add(prof)
+            except TypeError:   # a profile that never collected anything
+                pass
+        stats.dump_stats(pstats_path)
+        buf.write("=== cProfile (top 40 by cumulative time) ===\n")
+        stats.sort_stats("cumulative").print_stats(40)
+        current, peak = tracemalloc.get_traced_memory()
+        buf.write(f"\n=== tracemalloc (current {current / 1e6:.1f} MB, peak {peak / 1e6:.1f} MB) ===\n")
+        for stat in tracemalloc.take_snapshot().statistics("lineno")[:25]:
+            buf.write(f"{stat}\n")
+        tracemalloc.stop()
+        text_path.write_text(buf.getvalue(), encoding="utf-8")
+        return [pstats_path, text_path]
@@ -0,0 +1,469 @@
+import re, mmap, shutil, struct, tempfile
+from pathlib import Path
+from . import utils
+
+# Deleted-record recovery. The database and its -wal are memory-mapped
+# read-only and scanned page by page for records of the tables below. In copy
+# mode that is the run's snapshot (its connections are read-only, so its -wal
+# is never checkpointed away); the originals are only mapped in direct mode or
+# on an evidence image, where no browser can truncate them mid-scan (SIGBUS).
+#
+#   - WAL frames: every page image, older versions included
+#   - freelist trunk and leaf pages of the main file
+#   - main-file pages superseded by a WAL frame (their cells may be gone since)
+#   - unallocated space and freeblocks of every live table leaf page
+#
+# Intact cells are parsed through the page's cell pointers (rowid known, and
+# dropped when the live table still holds the same row). Free space is carved
+# with a per-table regex over record headers, built from the table's declared
+# column types and run by re directly on the mapping; candidates are decoded
+# from a memoryview, so no page is copied into Python bytes.
+
+# file: [(table, artifact, url column, title column, count column, time column, epoch)]
+TARGETS = {
+    "History": [("urls", "history", "url", "title", "visit_count", "last_visit_time", "webkit")],
+    "Cookies": [("cookies", "cookie", "host_key", "name", None, "last_access_utc", "webkit")],
+    "places.sqlite": [("moz_places", "history", "url", "title", "visit_count", "last_visit_date", "unix")],
+    "cookies.sqlite": [("moz_cookies", "cookie", "host", "name", None, "lastAccessed", "unix")],
+}
+WAL_MAGIC = (0x377F0682, 0x377F0683)
+TABLE_LEAF = 0x0D
+ENCODINGS = {1: "utf-8", 2: "utf-16-le", 3: "utf-16-be"}
+# Plausible timestamps (microseconds): 1995-01-01 .. 2100-01-01
+TIME_RANGE = {"webkit": (12443614400000000, 15777043200000000), "unix": (788918400000000, 4102444800000000)}
+HOST = re.compile(r"^\.?[A-Za-z0-9_-]+(\.[A-Za-z0-9_-]+)*\.?$")
+
+# ---- Record decoding ----
+def varint(buf, i, end):
+    """SQLite varint at buf[i]: (value, next offset); ValueError when it runs past end."""
+    v = 0
+    for n in range(9):
+        if i >= end:
+            raise ValueError("truncated varint")
+        b = buf[i]
+        i += 1
+        if n == 8:
+            return (v << 8) | b, i
+        v = (v << 7) | (b & 0x7F)
+        if b < 0x80:
+            return v, i
+    return v, i
+
+def read_types(buf, p, hdr_end):
+    """Serial types in buf[p:hdr_end]; almost all are one byte, read in one go."""
+    hdr = bytes(buf[p:hdr_end])
+    if hdr.isascii():
+        return list(hdr)
+    types, v = [], 0
+    for b in hdr:
+        v = (v << 7) | (b & 0x7F)
+        if b < 0x80:
+            types.append(v)
+            v = 0
+    if v:
+        raise ValueError("truncated header")
+    return types
+
+def serial_size(t):
+    if t >= 12:
+        return (t - 12) >> 1
+    if t in (10, 11):
+        raise ValueError("reserved serial type")
+    return (0, 1, 2, 3, 4, 6, 8, 8, 0, 0)[t]
+
+def fits(t, affinity):
+    """Can a value of serial type t sit in a column of this affinity?"""
+    if affinity == "alias":
+        return t == 0
+    if affinity == "integer":
+        return t <= 6 or t in (8, 9)
+    if affinity == "real":
+        return t <= 9
+    if affinity == "text":
+        return t == 0 or (t >= 13 and t & 1)
+    if affinity == "blob":
+        return t == 0 or (t >= 12 and not t & 1)
+    return t <= 9 or t >= 12
+
+def decode_body(buf, types, p, end, encoding):
+    """Column values for the serial types, body starting at p: (values, end of body)."""
+    values = []
+    for t in types:
+        size = serial_size(t)
+        if p + size > end:
+            raise ValueError("record runs past the page")
+        if t == 0:
+            v = None
+        elif t <= 6:
+            v = int.from_bytes(buf[p:p + size], "big", signed=True)
+        elif t == 7:
+            v = struct.unpack_from(">d", buf, p)[0]
+        elif t in (8, 9):
+            v = t - 8
+        elif t & 1:
+            v = str(buf[p:p + size], encoding)
+        else:
+            v = bytes(buf[p:p + size])
+        values.append(v)
+        p += size
+    return values, p
+
+class Table:
+    """A target table: its columns and affinities, and the record header pattern used to carve it."""
+    def __init__(self, con, spec):
+        self.name, self.artifact, url, title, count, time_col, self.epoch = spec
+        info = con.execute(f'PRAGMA table_info("{self.name}")').fetchall()
+        self.columns = [c[1] for c in info]
+        pks = [c for c in info if c[5]]
+        self.affinities = []
+        for _, name, decl, _, _, pk in info:
+            decl = (decl or "").upper()
+            if pk and len(pks) == 1 and decl == "INTEGER":
+                self.affinities.append("alias")   # rowid alias: stored as NULL
+            elif "INT" in decl:
+                self.affinities.append("integer")
+            elif any(s in decl for s in ("CHAR", "CLOB", "TEXT")):
+                self.affinities.append("text")
+            elif "BLOB" in decl:
+                self.affinities.append("blob")
+            elif any(s in decl for s in ("REAL", "FLOA", "DOUB")):
+                self.affinities.append("real")
+            else:
+                self.affinities.append("numeric")
+        self.alias = self.affinities.index("alias") if "alias" in self.affinities else None
+        self.idx = [self.columns.index(c) if c else None for c in (url, title, count, time_col)]
+        # Rows written before an ALTER TABLE ADD COLUMN have fewer columns; the
+        # ones this module reads must be there.
+        self.min_cols = max(i for i in self.idx if i is not None) + 1
+        # A column some index starts with (the URL/host one if possible), to look carved records up in the live table
+        firsts = {con.execute(f'PRAGMA index_info("{ix[1]}")').fetchone()[2]
+                  for ix in con.execute(f'PRAGMA index_list("{self.name}")').fetchall()} - {None}
+        keyed = [i for i in self.idx if i is not None and self.columns[i] in firsts]
+        self.lookup = keyed[0] if keyed else None
+        self.live_cols = ", ".join(f'"{c}"' for i, c in enumerate(self.columns) if i != self.alias)
+        self.live_hashes = None
+        self.pattern = re.compile(b"[\x02-\x7f]" + self._types_regex(0, self.min_cols), re.S)
+        # Serial types right after a freeblock header, by the number of header bytes it overwrote
+        self.headless = {1: re.compile(self._types_regex(0), re.S)}
+        if self.alias == 0:
+            self.headless[2] = re.compile(self._types_regex(1), re.S)
+
+    def _types_regex(self, i, optional_from=None):
+        """Serial types of columns i.. (columns from optional_from on may be missing at the end)."""
+        if i == len(self.columns):
+            return b""
+        cls = TYPE_CLASSES[self.affinities[i]] + self._types_regex(i + 1, optional_from)
+        return b"(?:" + cls + b")?" if optional_from is not None and i >= optional_from else cls
+
+    def valid(self, values):
+        url, title, count, t = (values[i] if i is not None else None for i in self.idx)
+        if not isinstance(url, str) or not url or not url.isprintable():
+            return False
+        if self.artifact == "cookie" and not HOST.match(url):
+            return False
+        if self.artifact == "history" and ":" not in url:
+            return False
+        if title is not None and not isinstance(title, str):
+            return False
+        if count is not None and (not isinstance(count, int) or count < 0):
+            return False
+        lo, hi = TIME_RANGE[self.epoch]
+        return t is None or t == 0 or (isinstance(t, int) and lo <= t <= hi)
+
+    def decode(self, buf, pos, end, encoding, checked=False):
+        """
+        Record with an intact header at pos: (values, end) or None. checked
+        means the serial types already matched self.pattern.
+        """
+        try:
+            hs, p = varint(buf, pos, end)
+            hdr_end = pos + hs
+            if hdr_end > end:
+                return None
+            types = read_types(buf, p, hdr_end)
+            return self._finish(buf, types, hdr_end, end, encoding, checked)
+        except (ValueError, UnicodeDecodeError, IndexError):
+            return None
+
+    def decode_headless(self, mm, buf, pos, end, encoding, missing):
+        """
+        Record whose first bytes were overwritten by a freeblock header: the
+        header size byte (missing=1), or it and the rowid alias NULL (missing=2),
+        are gone; the remaining serial types start at pos.
+        """
+        m = self.headless[missing].match(mm, pos, end)
+        if not m:
+            return None
+        try:
+            types = ([0] if missing == 2 else []) + read_types(buf, pos, m.end())
+            return self._finish(buf, types, m.end(), end, encoding, True)
+        except (ValueError, UnicodeDecodeError, IndexError):
+            return None
+
+    def _finish(self, buf, types, hdr_end, end, encoding, checked):
+        if not self.min_cols <= len(types) <= len(self.columns):
+            return None
+        if not checked and not all(fits(t, a) for t, a in zip(types, self.affinities)):
+            return None
+        values, body_end = decode_body(buf, types, hdr_end, end, encoding)
+        return (values, body_end) if self.valid(values) else None
+
+def _class(codes):
+    return b"[" + b"".join(re.escape(bytes([c])) for c in codes) + b"]"
+
+_ODD, _EVEN = range(13, 128, 2), range(12, 128, 2)
+TYPE_CLASSES = {   # serial type varints per affinity (1 byte, or 2 bytes for longer text/blobs)
+    "alias": b"\x00",
+    "integer": _class([0, 1, 2, 3, 4, 5, 6, 8, 9]),
+    "real": _class(range(0, 10)),
+    "text": b"(?:" + _class([0, *_ODD]) + b"|[\x81-\xff]" + _class(range(1, 128, 2)) + b")",
+    "blob": b"(?:" + _class([0, *_EVEN]) + b"|[\x81-\xff]" + _class(range(0, 128, 2)) + b")",
+    "numeric": b"(?:" + _class([*range(0, 10), *range(12, 128)]) + b"|[\x81-\xff][\x00-\x7f])",
+}
+
+# ---- Page walking ----
+class Scanner:
+    """Carves one database (and its WAL) for the target tables; records() yields (table, values, rowid)."""
+    def __init__(self, path: Path, tables, live):
+        self.path, self.tables, self.live = path, tables, live
+        self.seen = set()
+        self.found = {"wal": 0, "freelist": 0, "stale": 0, "unallocated": 0}
+
+    def records(self):
+        wal_pages = set()
+        wal = self.path.with_name(self.path.name + "-wal")
+        if wal.exists() and wal.stat().st_size > 32:
+            yield from self._mapped(wal, self._wal, wal_pages)
+        yield from self._mapped(self.path, self._main, wal_pages)
+
+    def _mapped(self, path, walk, wal_pages):
+        with open(path, "rb") as f:
+            if not path.stat().st_size:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                buf = memoryview(mm)
+                try:
+                    yield from walk(mm, buf, wal_pages)
+                finally:
+                    buf.release()
+
+    def _wal(self, mm, buf, wal_pages):
+        magic, _, page_size = struct.unpack_from(">III", buf, 0)
+        if magic not in WAL_MAGIC or page_size & (page_size - 1) or not 512 <= page_size <= 65536:
+            return
+        self.usable = page_size - self.reserved
+        frame = 32
+        while frame + 24 + page_size <= len(buf):
+            pgno = struct.unpack_from(">I", buf, frame)[0]
+            start = frame + 24
+            wal_pages.add(pgno)
+            yield from self._page(mm, buf, start, 100 if pgno == 1 else 0, "wal", cells=True)
+            frame = start + page_size
+
+    def header(self, buf):
+        page_size, = struct.unpack_from(">H", buf, 16)
+        self.page_size = 65536 if page_size == 1 else page_size
+        self.reserved = buf[20]
+        self.encoding = ENCODINGS.get(struct.unpack_from(">I", buf, 56)[0], "utf-8")
+        self.usable = self.page_size - self.reserved
+
+    def _main(self, mm, buf, wal_pages):
+        ps = self.page_size
+        npages = len(buf) // ps
+        free = self._freelist(buf, npages)
+        for pgno in range(1, npages + 1):
+            start, hdr = (pgno - 1) * ps, 100 if pgno == 1 else 0
+            kind = free.get(pgno)
+            if kind == "trunk":
+                count = struct.unpack_from(">I", buf, start + 4)[0]
+                yield from self._carve(mm, buf, start + 8 + 4 * min(count, ps // 4), start + self.usable,
+                                       start + self.usable, "freelist")
+            elif kind == "leaf":
+                if buf[start] == TABLE_LEAF:
+                    yield from self._page(mm, buf, start, 0, "freelist", cells=True)
+                else:
+                    yield from self._carve(mm, buf, start, start + self.usable, start + self.usable, "freelist")
+            elif pgno in wal_pages:
+                yield from self._page(mm, buf, start, hdr, "stale", cells=True)
+            else:
+                yield from self._page(mm, buf, start, hdr, "unallocated", cells=False)
+
+    def _freelist(self, buf, npages):
+        """{page number: "trunk" | "leaf"} following the trunk chain from the header."""
+        free = {}
+        trunk = struct.unpack_from(">I", buf, 32)[0]
+        while 0 < trunk <= npages and trunk not in free:
+            free[trunk] = "trunk"
+            off = (trunk - 1) * self.page_size
+            nxt, count = struct.unpack_from(">II", buf, off)
+            for i in range(min(count, self.usable // 4 - 2)):
+                leaf = struct.unpack_from(">I", buf, off + 8 + 4 * i)[0]
+                if 0 < leaf <= npages:
+                    free.setdefault(leaf, "leaf")
+            trunk = nxt
+        return free
+
+    def _page(self, mm, buf, start, hdr, source, cells):
+        """A table leaf page: intact cells (when cells is set), then its unallocated gap and freeblocks."""
+        h = start + hdr
+        if buf[h] != TABLE_LEAF:
+            return
+        first_free, ncells, content = struct.unpack_from(">HHH", buf, h + 1)
+        end = start + self.usable
+        ptrs = h + 8
+        if ptrs + 2 * ncells > end:
+            return
+        content = start + (content or 65536)
+        if cells:
+            for i in range(ncells):
+                ptr = start + struct.unpack_from(">H", buf, ptrs + 2 * i)[0]
+                if ptrs + 2 * ncells <= ptr < end:
+                    yield from self._cell(buf, ptr, end, source)
+        if ptrs + 2 * ncells < content <= end:
+            yield from self._carve(mm, buf, ptrs + 2 * ncells, content, end, source)
+        block, hops = first_free, 0
+        while block and hops < 1000:
+            fb = start + block
+            if not content <= fb < end - 4:
+                break
+            nxt, size = struct.unpack_from(">HH", buf, fb)
+            yield from self._freeblock(mm, buf, fb, min(fb + size, end), end, source)
+            block, hops = nxt, hops + 1
+
+    def _cell(self, buf, ptr, end, source):
+        try:
+            size, p = varint(buf, ptr, end)
+            rowid, p = varint(buf, p, end)
+        except ValueError:
+            return
+        # Bytes of the payload stored on this page; records spilling to overflow pages fail to decode
+        u = self.usable
+        if size > u - 35:
+            m = (u - 12) * 32 // 255 - 23
+            k = m + (size - m) % (u - 4)
+            size = k if k <= u - 35 else m
+        for table in self.tables:
+            rec = table.decode(buf, p, min(p + size, end), self.encoding)
+            if rec:
+                yield from self._emit(table, rec[0], rowid, source)
+                return
+
+    def _carve(self, mm, buf, lo, hi, end, source):
+        """Scan [lo, hi) for record headers of any table; a record may extend up to end."""
+        for table in self.tables:
+            pos = lo
+            while pos < hi:
+                m = table.pattern.search(mm, pos, hi)
+                if not m:
+                    break
+                rec = table.decode(buf, m.start(), end, self.encoding, checked=True)
+                if rec:
+                    yield from self._emit(table, rec[0], None, source)
+                    pos = rec[1]
+                else:
+                    pos = m.start() + 1
+
+    def _freeblock(self, mm, buf, fb, hi, end, source):
+        # The 4-byte freeblock header overwrote the start of the deleted cell
+        pos = fb + 4
+        for table in self.tables:
+            for missing in (1, 2) if table.alias == 0 else (1,):
+                rec = table.decode_headless(mm, buf, fb + 4, end, self.encoding, missing)
+                if rec:
+                    yield from self._emit(table, rec[0], None, source)
+                    pos = rec[1]
+                    break
+            if pos > fb + 4:
+                break
+        yield from self._carve(mm, buf, pos, hi, end, source)
+
+    def _emit(self, table, values, rowid, source):
+        if rowid is not None and table.alias is not None:
+            values[table.alias] = rowid
+        key = (table.name, tuple(v for i, v in enumerate(values) if i != table.alias))
+        if key in self.seen:
+            return
+        self.seen.add(key)
+        if self._is_live(table, values, rowid):
+            return
+        self.found[source] += 1
+        yield table, values + [None] * (len(table.columns) - len(values))
+
+    def _is_live(self, table, values, rowid):
+        """
+        Is this record (an older copy of) a row the live table still has?
+        Records older than an added column are compared on the columns they have.
+        """
+        n = len(values)
+        if rowid is not None:
+            row = self.live.execute(f'SELECT * FROM "{table.name}" WHERE rowid = ?', (rowid,)).fetchone()
+            return row is not None and list(row[:n]) == values
+        # Carved: the rowid is lost, match on the other columns
+        key = tuple(v for i, v in enumerate(values) if i != table.alias)
+        if table.lookup is not None and values[table.lookup] is not None:
+            rows = self.live.execute(f'SELECT {table.live_cols} FROM "{table.name}" WHERE "{table.columns[table.lookup]}" = ?',
+                                     (values[table.lookup],))
+            return any(r[:len(key)] == key for r in rows)
+        if table.live_hashes is None:   # no usable index: hash every live row once
+            table.live_hashes = set(map(hash, utils.query(self.live, f'SELECT {table.live_cols} FROM "{table.name}"')))
+        return hash(key) in table.live_hashes
+
+def recover(path: Path, con, specs):
+    """(table, values) for every deleted record carved from path and its WAL; con is the live database."""
+    tables = []
+    for spec in specs:
+        if con.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (spec[0],)).fetchone():
+            tables.append(Table(con, spec))
+    if not tables or not path.stat().st_size:
+        return
+    scanner = Scanner(path, tables, con)
+    with open(path, "rb") as f:
+        head = f.read(100)
+    if len(head) < 100 or not head.startswith(b"SQLite format 3\x00"):
+        return
+    scanner.header(head)
+    yield from scanner.records()
+    utils.log_line(f"Recovered {sum(scanner.found.values())} records from {path}", source=str(path), **scanner.found)
+
+def extract(profile, ctx):
+    """Deleted history and cookie records (ctx.recover), tagged extra="recovered"."""
+    if not ctx.recover:
+        return
+    browser, prof = profile.browser, profile.path
+    for name, specs in TARGETS.items():
+        db = profile.file(name)
+        key = ctx.key(browser, prof, f"recovered:{name}")
+        if not db or ctx.unchanged(key, db):
+            continue
+        con = ctx.connect(db)
+        if not con:
+            continue
+        copy = None
+        try:
+            if ctx.methods.get(str(db)) != "direct" and not ctx.meta.get("evidence_root"):
+                src = ctx.snapshot(db)
+            else:
+                try:
+                    open(db, "rb").close()
+                    src = db
+                except OSError:   # locked: carve a private copy
+                    copy = Path(tempfile.mkdtemp(prefix="frostveil_recover_"))
+                    src = utils.safe_copy(db, copy / db.name)
+                    wal = db.with_name(db.name + "-wal")
+                    if src and wal.exists():
+                        utils.safe_copy(wal, copy / wal.name)
+            for table, values in recover(src, con, specs) if src else ():
+                url, title, count, t = (values[i] if i is not None else None for i in table.idx)
+                ts = utils.utc_from_us(t, table.epoch)
+                yield utils.Row(
+                    browser=browser, artifact=table.artifact,
+                    profile=str(prof), url=url, title=title or "",
+                    visit_count=count, visit_time_utc=ts, extra="recovered"
+                )
+            ctx.advance(key)
+        except Exception as e:
+            utils.log_line(f"Error recovery {browser} {db}: {e}")
+        finally:
+            con.close()
+            if copy:
+                shutil.rmtree(copy, ignore_errors=True)
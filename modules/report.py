@@ -1,7 +1,7 @@
 from pathlib import Path
 import json
 
-def generate(manifest, rows):
+def generate(manifest):
     out = Path("report.md")
     counts = manifest["counts"]
     md = []
@@ -20,5 +20,24 @@ def generate(manifest, rows):
     for f,h in manifest["outputs"].items():
         md.append(f"- {f} (SHA256={h})")
     md.append("")
+    sources = manifest.get("sources")
+    if sources:
+        md.append("## Sources")
+        for f, src in sources.items():
+            md.append(f"- {f} (SHA256={src['sha256']}, {src['method']})")
+        md.append("")
+    perf = manifest.get("performance")
+    if perf:
+        md.append("## Performance")
+        md.append(f"- Total: {perf['total_s']:.2f}s (extraction {perf['extract_s']:.2f}s, writing {perf['write_s']:.2f}s, "
+                  f"hashing {perf.get('hash_s', 0):.2f}s)")
+        md.append(f"- Rows: {perf['rows']}, copied: {perf['bytes_copied'] / 1e6:.1f} MB, peak RSS: {perf['peak_rss_mb']} MB")
+        md.append("")
+        md.append("| Browser | Profile | Extractor | Time (s) | Rows | Rows/s | Copied (MB) |")
+        md.append("|---|---|---|---|---|---|---|")
+        for st in sorted(perf["stages"], key=lambda st: -st["wall_s"]):
+            md.append(f"| {st['browser']} | {st['profile']} | {st['extractor']} | {st['wall_s']:.3f} | "
+                      f"{st['rows']} | {st['rows_per_s'] or ''} | {st['bytes_copied'] / 1e6:.1f} |")
+        md.append("")
     out.write_text("\n".join(md), encoding="utf-8")
     return out
@@ -0,0 +1,70 @@
+import queue, threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Runs (browser, profile, extractor) jobs on a thread pool. Copies and SQLite
+# scans release the GIL, so jobs overlap their I/O. Each job streams its rows
+# through its own bounded queue and the consumer drains the queues in job
+# order, so output is identical to a sequential run whatever the timing.
+
+BATCH = 500      # rows per queue item
+DEPTH = 8        # queued batches per job before the producer blocks
+
+class _Done:
+    def __init__(self, error=None):
+        self.error = error
+
+def run(jobs, fn, workers=1, on_start=None, on_error=None):
+    """Yield every row of fn(job) for each job, in job order."""
+    if workers <= 1:
+        for job in jobs:
+            if on_start: on_start(job)
+            try:
+                yield from fn(job)
+            except Exception as e:
+                if on_error: on_error(job, e)
+        return
+
+    stop = threading.Event()
+
+    def put(q, item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce(job, q):
+        batch = []
+        try:
+            for row in fn(job):
+                batch.append(row)
+                if len(batch) >= BATCH:
+                    if not put(q, batch): return
+                    batch = []
+            if batch and not put(q, batch): return
+            put(q, _Done())
+        except Exception as e:
+            if batch and not put(q, batch): return
+            put(q, _Done(e))
+
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="extract")
+    try:
+        pending = []
+        for job in jobs:
+            q = queue.Queue(maxsize=DEPTH)
+            pool.submit(produce, job, q)
+            pending.append((job, q))
+        for job, q in pending:
+            if on_start: on_start(job)
+            while True:
+                item = q.get()
+                if isinstance(item, _Done):
+                    if item.error is not None and on_error:
+                        on_error(job, item.error)
+                    break
+                yield from item
+    finally:
+        stop.set()
+        pool.shutdown(wait=True, cancel_futures=True)
@@ -1,42 +1,59 @@
-import sqlite3
-from pathlib import Path
 from . import utils
 
-def extract(browser, path: Path, meta):
-    rows = []
-    if browser in ["chrome","edge"]:
-        tmp = utils.safe_copy(path)
-        if not tmp: return rows
+def extract(profile, ctx):
+    browser, prof = profile.browser, profile.path
+    if profile.family == "chromium":
+        db = profile.file("History")
+        key = ctx.key(browser, prof, "search")
+        if not db or ctx.unchanged(key, db): return
+        con = ctx.connect(db)
+        if not con: return
         try:
-            con = sqlite3.connect(str(tmp))
-            cur = con.cursor()
-            cur.execute("SELECT term, url_id FROM keyword_search_terms")
-            for term, url_id in cur.fetchall():
-                rows.append({
-                    **meta, "browser": browser, "artifact": "search",
-                    "profile": str(path.parent), "url": f"url_id={url_id}", "title": term,
-                    "visit_count": None, "visit_time_utc": None, "extra": ""
-                })
-            con.close()
+            cond, params = ctx.since(key, "keyword_search_terms")
+            searched = "COALESCE(first_visit, last_visit_time)"
+            filt, fparams = ctx.filters.sql(searched, "webkit", "url")
+            # The search results page is the urls row the term points at, and the
+            # term was entered when that page was first visited (visits_url_index).
+            # urls.last_visit_time only stands in once those visits have expired.
+            delta, dparams = ctx.delta(key, "keyword_search_terms")
+            sql = (f"SELECT term, url, {utils.sql_utc_from_webkit(searched)}, first_visit IS NULL, tag FROM ("
+                   "SELECT term, COALESCE(urls.url, 'url_id=' || url_id) AS url, "
+                   "(SELECT min(visit_time) FROM visits WHERE visits.url = keyword_search_terms.url_id) AS first_visit, "
+                   f"urls.last_visit_time, {delta} AS tag "
+                   f"FROM keyword_search_terms LEFT JOIN urls ON urls.id = keyword_search_terms.url_id{utils.where([cond])}"
+                   f"){utils.where([filt])}")
+            for term, url, ts, fallback, tag in utils.query(con, sql, dparams + params + fparams):
+                yield utils.Row(
+                    browser=browser, artifact="search",
+                    profile=str(prof), url=url, title=term,
+                    visit_count=None, visit_time_utc=ts,
+                    extra=utils.extra("time=url_last_visit" if fallback and ts else "", tag)
+                )
+            ctx.advance(key, con, "keyword_search_terms")
         except Exception as e:
             utils.log_line(f"Error searches {browser}: {e}")
-    elif browser=="firefox":
-        profs = path.glob("*.default*") if path.is_dir() else []
-        for prof in profs:
-            fh = prof / "formhistory.sqlite"
-            tmp = utils.safe_copy(fh)
-            if not tmp: continue
-            try:
-                con = sqlite3.connect(str(tmp))
-                cur = con.cursor()
-                cur.execute("SELECT fieldname, value, timesUsed FROM moz_formhistory")
-                for fn, val, times in cur.fetchall():
-                    rows.append({
-                        **meta, "browser": "firefox", "artifact": "search",
-                        "profile": str(prof), "url": "", "title": val,
-                        "visit_count": times, "visit_time_utc": None, "extra": f"field={fn}"
-                    })
-                con.close()
-            except Exception as e:
-                utils.log_line(f"Error searches firefox {prof}: {e}")
-    return rows
+        finally:
+            con.close()
+    elif profile.family == "firefox":
+        fh = profile.file("formhistory.sqlite")
+        key = ctx.key("firefox", prof, "search")
+        if not fh or ctx.unchanged(key, fh): return
+        con = ctx.connect(fh)
+        if not con: return
+        try:
+            cond, params = ctx.since(key, "moz_formhistory", "lastUsed")
+            filt, fparams = ctx.filters.sql("lastUsed", "unix")   # form entries have no URL
+            delta, dparams = ctx.delta(key, "moz_formhistory")
+            sql = (f"SELECT fieldname, value, timesUsed, {utils.sql_utc_from_unix('lastUsed')}, {delta} "
+                   f"FROM moz_formhistory{utils.where([cond, filt])}")
+            for fn, val, times, ts, tag in utils.query(con, sql, dparams + params + fparams):
+                yield utils.Row(
+                    browser="firefox", artifact="search",
+                    profile=str(prof), url="", title=val,
+                    visit_count=times, visit_time_utc=ts, extra=utils.extra(f"field={fn}", tag)
+                )
+            ctx.advance(key, con, "moz_formhistory", "lastUsed")
+        except Exception as e:
+            utils.log_line(f"Error searches firefox {prof}: {e}")
+        finally:
+            con.close()
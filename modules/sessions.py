@@ -1,31 +1,198 @@
-import json, lzma
-from pathlib import Path
+import json, struct
 from . import utils
 
-def extract(browser, path: Path, meta):
-    rows = []
-    if browser in ["chrome","edge"]:
-        # Chromium session files vary; best-effort parse
-        sess_file = path.parent / "Sessions"
-        if sess_file.exists():
-            rows.append({
-                **meta, "browser": browser, "artifact": "session",
-                "profile": str(path.parent), "url": "<session data>", "title": "",
-                "visit_count": None, "visit_time_utc": None, "extra": "binary session not parsed"
-            })
-    elif browser=="firefox":
-        profs = path.glob("*.default*") if path.is_dir() else []
-        for prof in profs:
-            ss = prof / "sessionstore.jsonlz4"
-            if ss.exists():
-                try:
-                    raw = ss.read_bytes()
-                    # Firefox sessionstore uses LZ4; fallback: mark as raw
-                    rows.append({
-                        **meta, "browser": "firefox", "artifact": "session",
-                        "profile": str(prof), "url": "<sessionstore>", "title": "",
-                        "visit_count": None, "visit_time_utc": None, "extra": f"size={len(raw)}"
-                    })
-                except Exception as e:
-                    utils.log_line(f"Error sessions firefox {prof}: {e}")
-    return rows
+try:   # optional C decoder; the pure-Python one below is used otherwise
+    import lz4.block as _lz4
+except ImportError:
+    _lz4 = None
+
+# ---- Firefox mozlz4 (sessionstore.jsonlz4) ----
+MOZLZ4_MAGIC = b"mozLz40\0"
+
+def lz4_block_decompress(src, size):
+    """
+    Decode one raw LZ4 block into exactly size bytes. Literals and
+    non-overlapping matches are copied as memoryview slices into a
+    preallocated buffer; only overlapping matches are expanded by repetition.
+    """
+    src = memoryview(src)
+    dst = bytearray(size)
+    out = memoryview(dst)
+    n, si, di = len(src), 0, 0
+    while si < n:
+        token = src[si]
+        si += 1
+        lit = token >> 4
+        if lit == 15:
+            while True:
+                b = src[si]
+                si += 1
+                lit += b
+                if b != 255:
+                    break
+        if lit:
+            out[di:di + lit] = src[si:si + lit]
+            si += lit
+            di += lit
+        if si >= n:   # the last sequence has literals only
+            break
+        off = src[si] | (src[si + 1] << 8)
+        si += 2
+        mlen = token & 15
+        if mlen == 15:
+            while True:
+                b = src[si]
+                si += 1
+                mlen += b
+                if b != 255:
+                    break
+        mlen += 4
+        start = di - off
+        if off == 0 or start < 0:
+            raise ValueError(f"corrupt LZ4 block: bad match offset {off} at {si}")
+        if off >= mlen:
+            out[di:di + mlen] = out[start:start + mlen]
+        else:
+            out[di:di + mlen] = (dst[start:di] * (mlen // off + 1))[:mlen]
+        di += mlen
+    if di != size:
+        raise ValueError(f"corrupt LZ4 block: {di} bytes decoded, {size} expected")
+    return dst
+
+def mozlz4_decompress(data):
+    """Payload of a Firefox .jsonlz4/.mozlz4 file: magic, uint32 decoded size, one LZ4 block."""
+    if data[:8] != MOZLZ4_MAGIC:
+        raise ValueError("not a mozlz4 file")
+    size = struct.unpack_from("<I", data, 8)[0]
+    if _lz4:
+        return _lz4.decompress(bytes(data[12:]), uncompressed_size=size)
+    return lz4_block_decompress(memoryview(data)[12:], size)
+
+def firefox_tabs(session):
+    """(state, window index, tab) for open tabs, closed tabs and tabs of closed windows."""
+    for w, win in enumerate(session.get("windows", [])):
+        for tab in win.get("tabs", []):
+            yield "open", w, tab
+        for closed in win.get("_closedTabs", []):
+            yield "closed_tab", w, dict(closed.get("state", {}), closedAt=closed.get("closedAt"))
+    for w, win in enumerate(session.get("_closedWindows", [])):
+        for tab in win.get("tabs", []):
+            yield "closed_window", w, dict(tab, closedAt=win.get("closedAt"))
+
+# ---- Chromium SNSS (Sessions/Session_*, Sessions/Tabs_*) ----
+SNSS_MAGIC = b"SNSS"
+# UpdateTabNavigation command id: Session_* files use the session service ids,
+# Tabs_* (recently closed) files the tab restore service ids
+NAVIGATION_COMMAND = {"session": 6, "tabs": 1}
+
+def snss_records(buf):
+    """Yield (command id, payload) per record; payloads are memoryview slices of buf."""
+    mv = memoryview(buf)
+    if mv[:4] != SNSS_MAGIC:
+        raise ValueError("not an SNSS file")
+    pos, n = 8, len(mv)   # magic + int32 version
+    while pos + 2 <= n:
+        size = mv[pos] | (mv[pos + 1] << 8)
+        pos += 2
+        if size == 0 or pos + size > n:   # truncated tail of a file still being written
+            break
+        yield mv[pos], mv[pos + 1:pos + size]
+        pos += size
+
+class _Pickle:
+    """Reader for a base::Pickle payload: uint32 size header, fields padded to 4 bytes."""
+    def __init__(self, mv):
+        self.mv, self.pos = mv, 4
+
+    def int32(self):
+        v = struct.unpack_from("<i", self.mv, self.pos)[0]
+        self.pos += 4
+        return v
+
+    def int64(self):
+        v = struct.unpack_from("<q", self.mv, self.pos)[0]
+        self.pos += 8
+        return v
+
+    def raw(self, n):
+        if n < 0 or self.pos + n > len(self.mv):
+            raise ValueError("pickle field out of range")
+        b = self.mv[self.pos:self.pos + n]
+        self.pos += (n + 3) & ~3
+        return b
+
+    def string(self):
+        return str(self.raw(self.int32()), "utf-8", "replace")
+
+    def string16(self):
+        return str(self.raw(self.int32() * 2), "utf-16-le", "replace")
+
+def snss_navigation(payload):
+    """(tab id, index, url, title, timestamp or None) from an UpdateTabNavigation payload."""
+    p = _Pickle(payload)
+    tab_id, index, url, title = p.int32(), p.int32(), p.string(), p.string16()
+    ts = None
+    try:
+        p.string()                   # encoded page state
+        p.int32(); p.int32()         # transition type, type mask
+        p.string(); p.int32()        # referrer url, referrer policy
+        p.string(); p.int32()        # original request url, is overriding user agent
+        ts = p.int64()
+    except (ValueError, struct.error):
+        pass                         # older writers stop before the timestamp
+    return tab_id, index, url, title, ts
+
+def snss_navigations(buf, kind):
+    """Latest state of every (tab, index) navigation recorded in one SNSS file."""
+    command = NAVIGATION_COMMAND[kind]
+    navs = {}
+    for cid, payload in snss_records(buf):
+        if cid == command:
+            try:
+                nav = snss_navigation(payload)
+            except (ValueError, struct.error):
+                continue
+            navs[nav[:2]] = nav
+    return navs.values()
+
+def snss_kind(name):
+    return "tabs" if name.startswith(("Tabs_", "Current Tabs", "Last Tabs")) else "session"
+
+def extract(profile, ctx):
+    browser, prof = profile.browser, profile.path
+    if profile.family == "chromium":
+        for sess_file in profile.sessions:
+            key = ctx.key(browser, prof, f"session:{sess_file.name}")
+            if ctx.unchanged(key, sess_file):
+                continue
+            try:
+                kind = snss_kind(sess_file.name)
+                for tab_id, index, url, title, ts in snss_navigations(sess_file.read_bytes(), kind):
+                    yield utils.Row(
+                        browser=browser, artifact="session",
+                        profile=str(prof), url=url, title=title,
+                        visit_count=None, visit_time_utc=utils.utc_from_webkit(ts),
+                        extra=f"file={sess_file.name} {'closed_tab' if kind == 'tabs' else 'tab'}={tab_id} index={index}"
+                    )
+                ctx.advance(key)
+            except Exception as e:
+                utils.log_line(f"Error sessions {browser} {sess_file}: {e}")
+    elif profile.family == "firefox":
+        ss = profile.file("sessionstore.jsonlz4")
+        key = ctx.key("firefox", prof, "session")
+        if ss and not ctx.unchanged(key, ss):
+            try:
+                session = json.loads(mozlz4_decompress(ss.read_bytes()))
+                for state, w, tab in firefox_tabs(session):
+                    entries = tab.get("entries") or [{}]
+                    entry = entries[min(max(tab.get("index", len(entries)), 1), len(entries)) - 1]
+                    when = tab.get("closedAt") or tab.get("lastAccessed")
+                    yield utils.Row(
+                        browser="firefox", artifact="session",
+                        profile=str(prof), url=entry.get("url", ""), title=entry.get("title", ""),
+                        visit_count=None, visit_time_utc=utils.utc_from_unix(when * 1000 if when else None),
+                        extra=f"state={state} window={w} entries={len(tab.get('entries') or [])}"
+                    )
+                ctx.advance(key)
+            except Exception as e:
+                utils.log_line(f"Error sessions firefox {prof}: {e}")
@@ -0,0 +1,74 @@
+import json, os, threading
+from pathlib import Path
+from . import utils
+
+# Delta acquisition state. For every (browser, profile, artifact) key the state
+# file keeps the high-water marks reached by the last run (max rowid, max
+# timestamp) and the signature of the source file at that point. The next run
+# skips keys whose source is unchanged and only queries rows past the marks.
+# The source's SHA256 is taken once its rows were read, through digest (the
+# run's utils.SourceHashes.digest, so a copied source is not read again).
+
+def signature(path: Path):
+    """Cheap change detector: (size, mtime_ns) of the file and its SQLite sidecars."""
+    sig = []
+    for p in [path] + [path.with_name(path.name + s) for s in utils.SnapshotCache.SIDECARS]:
+        try:
+            st = p.stat()
+            sig.append([p.name, st.st_size, st.st_mtime_ns])
+        except OSError:
+            pass
+    return sig
+
+class DeltaState:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.baseline = {}
+        if self.path.exists():
+            self.baseline = json.loads(self.path.read_text(encoding="utf-8"))
+        self.marks = dict(self.baseline.get("marks", {}))
+        self.pending = {}
+        self.digest = utils.sha256_file
+        self.lock = threading.Lock()
+
+    def baseline_info(self):
+        """What the manifest records about the run this one is a delta against."""
+        if not self.baseline:
+            return None
+        return {
+            "state": str(self.path),
+            "sha256": utils.sha256_file(self.path),
+            "acquired_utc": self.baseline.get("acquired_utc"),
+        }
+
+    def unchanged(self, key, path: Path):
+        """True if the source behind key has not changed since the baseline run."""
+        sig = signature(path)
+        old = self.marks.get(key)
+        if old and old.get("file") == sig:
+            return True
+        with self.lock:
+            self.pending[key] = {"file": sig, "source": path}
+        return False
+
+    def since(self, key):
+        return self.marks.get(key) or {}
+
+    def advance(self, key, rowid=None, time=None):
+        """Record new marks for key; only called once its rows were fully read."""
+        with self.lock:
+            mark = dict(self.pending.pop(key, {}))
+        source = mark.pop("source", None)
+        if source is not None:
+            mark["sha256"] = self.digest(source) if source.is_file() else None
+        with self.lock:
+            old = self.marks.get(key) or {}
+            mark["rowid"] = max(x for x in (rowid, old.get("rowid"), 0) if x is not None)
+            mark["time"] = max(x for x in (time, old.get("time"), 0) if x is not None)
+            self.marks[key] = mark
+
+    def save(self, meta):
+        data = {"acquired_utc": meta["acquired_utc"], "marks": dict(sorted(self.marks.items()))}
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps(data, indent=2), encoding="utf-8")
+        os.replace(tmp, self.path)
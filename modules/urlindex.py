@@ -0,0 +1,65 @@
+import hashlib
+from urllib.parse import urlsplit, urlunsplit
+
+# Shared URL/host index. Every distinct URL or host string seen in the rows is
+# normalized once (scheme and host lowercased, default port and trailing dot
+# dropped, empty http(s) path made "/"; cookie hosts lose their leading dot),
+# interned, and given a stable ID: the first 8 bytes of BLAKE2b over the
+# normalized form, so IDs agree across runs and machines. A host's ID is the
+# same whether it came from a cookie or from a URL.
+
+COLUMNS = ("url_id", "kind", "url", "host_id", "host")
+DEFAULT_PORTS = {"http": 80, "https": 443, "ws": 80, "wss": 443, "ftp": 21}
+
+def stable_id(value):
+    return hashlib.blake2b(value.encode("utf-8"), digest_size=8).hexdigest()
+
+def normalize_host(host):
+    return host.strip().lstrip(".").rstrip(".").lower()
+
+def normalize(value):
+    """(kind, normalized value, host): kind is "url", "host" or "other" (kept verbatim)."""
+    if "://" in value:
+        try:
+            parts = urlsplit(value)
+            host, port = normalize_host(parts.hostname or ""), parts.port
+        except ValueError:
+            return "other", value, ""
+        scheme = parts.scheme.lower()
+        netloc = f"[{host}]" if ":" in host else host
+        if parts.username is not None:
+            userinfo = parts.username + (f":{parts.password}" if parts.password is not None else "")
+            netloc = f"{userinfo}@{netloc}"
+        if port is not None and port != DEFAULT_PORTS.get(scheme):
+            netloc += f":{port}"
+        path = parts.path or ("/" if scheme in ("http", "https") else "")
+        return "url", urlunsplit((scheme, netloc, path, parts.query, parts.fragment)), host
+    if value and not any(c in value for c in "/ =<>"):
+        host = normalize_host(value)
+        return "host", host, host
+    return "other", value, ""
+
+class UrlIndex:
+    """Interns URL/host strings as rows stream past; ref() swaps a row's url for its ID."""
+    def __init__(self):
+        self.ids = {}       # raw string -> url_id
+        self.entries = {}   # url_id -> (url_id, kind, url, host_id, host), in first-seen order
+
+    def intern(self, value):
+        """Stable ID for a raw URL or host string (None and "" are not indexed)."""
+        if not value:
+            return value
+        uid = self.ids.get(value)
+        if uid is None:
+            kind, norm, host = normalize(value)
+            uid = stable_id(norm)
+            if uid not in self.entries:
+                self.entries[uid] = (uid, kind, norm, stable_id(host) if host else None, host or None)
+            self.ids[value] = uid
+        return uid
+
+    def ref(self, row):
+        return row._replace(url=self.intern(row.url))
+
+    def rows(self):
+        return self.entries.values()
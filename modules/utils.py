@@ -1,6 +1,16 @@
-import os, sys, shutil, tempfile, hashlib, platform, getpass, socket, subprocess
+import os, io, sys, json, time, queue, atexit, sqlite3, shutil, tempfile, hashlib, platform, getpass, socket, subprocess, threading
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timedelta
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import util as mp_util
+from . import profiling
+
+# ---- Row schema ----
+# Extractors yield compact Row tuples; run-level metadata (get_metadata()) is
+# stored once and prepended by the writers.
+COLUMNS = ("browser", "artifact", "profile", "url", "title", "visit_count", "visit_time_utc", "extra")
+Row = namedtuple("Row", COLUMNS)
 
 # ---- Time helpers ----
 def utc_from_webkit(ts):
@@ -13,17 +23,152 @@ def utc_from_unix(ts):
         return None
     return datetime.utcfromtimestamp(ts/1e6).isoformat()
 
+EPOCHS = {"webkit": datetime(1601, 1, 1), "unix": datetime(1970, 1, 1)}
+
+def utc_from_us(ts, epoch="webkit"):
+    """Exact (integer) conversion of microseconds since the epoch; same text as the SQL helpers below."""
+    if not ts:
+        return None
+    return (EPOCHS[epoch] + timedelta(microseconds=int(ts))).isoformat()
+
+# SQL equivalents, so conversion happens inside SQLite rather than per row in
+# Python. Integer arithmetic: exact to the microsecond, same text as isoformat().
+WEBKIT_EPOCH_OFFSET_US = 11644473600 * 1000000
+
+def _sql_iso(col, us):
+    frac = f"((({us}) % 1000000) + 1000000) % 1000000"
+    return (f"(CASE WHEN {col} IS NULL OR {col} = 0 THEN NULL ELSE "
+            f"strftime('%Y-%m-%dT%H:%M:%S', (({us}) - {frac}) / 1000000, 'unixepoch') || "
+            f"CASE WHEN {frac} THEN printf('.%06d', {frac}) ELSE '' END END)")
+
+def sql_utc_from_webkit(col):
+    return _sql_iso(col, f"CAST({col} AS INTEGER) - {WEBKIT_EPOCH_OFFSET_US}")
+
+def sql_utc_from_unix(col):
+    return _sql_iso(col, f"CAST({col} AS INTEGER)")
+
 # ---- Hashing ----
+HASH_BUFFER = 1024 * 1024   # large reads: hashlib releases the GIL, so threads hash in parallel
+
+def _hash_into(src, h, out=None):
+    buf = bytearray(HASH_BUFFER)
+    view = memoryview(buf)
+    while n := src.readinto(buf):
+        h.update(view[:n])
+        if out is not None:
+            out.write(view[:n])
+
 def sha256_file(path: Path):
     h = hashlib.sha256()
     try:
         with open(path, "rb") as f:
-            for chunk in iter(lambda: f.read(8192), b""):
-                h.update(chunk)
+            _hash_into(f, h)
         return h.hexdigest()
     except Exception:
         return None
 
+def copy_hashed(src: Path, dst: Path):
+    """shutil.copy2 that also returns the SHA256 of the bytes copied (one read for both)."""
+    h = hashlib.sha256()
+    with open(src, "rb") as fi, open(dst, "wb") as fo:
+        _hash_into(fi, h, fo)
+    shutil.copystat(src, dst)
+    return h.hexdigest()
+
+def stat_key(path):
+    """[size, mtime_ns, inode]: a file with the same key is taken to have the same content."""
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns, st.st_ino]
+
+class SourceHashes:
+    """
+    SHA256 of every source file acquired in a run. Copied files are hashed
+    while they are copied (safe_copy); files read in place are hashed by
+    finish(), in parallel. With a cache file, a file whose path, size, mtime
+    and inode match a cached entry is not read again.
+    """
+    def __init__(self, cache=None):
+        self.cache_path = Path(cache) if cache else None
+        self.cache = {}   # path -> [size, mtime_ns, inode, sha256]
+        if self.cache_path and self.cache_path.exists():
+            try:
+                self.cache = json.loads(self.cache_path.read_text(encoding="utf-8"))["files"]
+            except (ValueError, KeyError, OSError) as e:
+                log_line(f"Ignoring unreadable hash cache {self.cache_path}: {e}")
+        self.entries = {}   # path -> {"sha256", "size", "method"}
+        self.wanted = set()
+        self.lock = threading.Lock()
+
+    def add(self, path, digest, key=None, method="copy"):
+        """Record digest for path; key is its stat_key() from before it was read (None: do not cache)."""
+        with self.lock:
+            self.entries[str(path)] = {"sha256": digest, "size": key[0] if key else None, "method": method}
+            if key is not None:
+                try:
+                    if stat_key(path) == key:   # unchanged while being read
+                        self.cache[str(path)] = key + [digest]
+                except OSError:
+                    pass
+
+    def want(self, path):
+        """path is being acquired; hash it in finish() unless a copy hashes it first."""
+        with self.lock:
+            self.wanted.add(str(path))
+
+    def digest(self, path):
+        """SHA256 of path: from this run, from the cache, or by reading it now (None if missing)."""
+        with self.lock:
+            entry = self.entries.get(str(path))
+        if entry:
+            return entry["sha256"]
+        try:
+            key = stat_key(path)
+        except OSError:
+            return None
+        cached = self.cache.get(str(path))
+        if cached and cached[:3] == key:
+            with self.lock:
+                self.entries[str(path)] = {"sha256": cached[3], "size": key[0], "method": "cache"}
+            return cached[3]
+        digest = sha256_file(path)
+        if digest:
+            self.add(path, digest, key, method="read")
+        return digest
+
+    def finish(self, workers=None):
+        """Hash the wanted files not hashed yet, save the cache; {path: entry} for the manifest."""
+        with self.lock:
+            todo = sorted(p for p in self.wanted if p not in self.entries and Path(p).is_file())
+        if todo:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hash") as pool:
+                list(pool.map(self.digest, todo))
+        if self.cache_path:
+            tmp = self.cache_path.with_name(self.cache_path.name + ".tmp")
+            tmp.write_text(json.dumps({"files": dict(sorted(self.cache.items()))}), encoding="utf-8")
+            os.replace(tmp, self.cache_path)
+        return dict(sorted(self.entries.items()))
+
+class HashingFile(io.RawIOBase):
+    """Write-only file that SHA256-hashes every byte on its way to disk (no re-read later)."""
+    def __init__(self, path):
+        self.f = open(path, "wb")
+        self.sha = hashlib.sha256()
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.sha.update(b)
+        return self.f.write(b)
+
+    def hexdigest(self):
+        return self.sha.hexdigest()
+
+    def close(self):
+        if not self.closed:
+            self.f.close()
+        super().close()
+
 # ---- Metadata ----
 def get_metadata():
     return {
@@ -34,19 +179,92 @@ def get_metadata():
     }
 
 # ---- Logging ----
-def log_line(msg):
-    with open("history_export.log", "a", encoding="utf-8") as f:
-        f.write(f"[{datetime.utcnow().isoformat()}Z] {msg}\n")
+LOG_FILE = "history_export.log"
+
+class JsonLog:
+    """
+    Structured (JSON lines) log with one open handle per process. Callers only
+    enqueue a record; a background thread drains the queue and appends whole
+    batches with a single write, so logging never blocks extraction and lines
+    from threads or processes sharing the file never interleave.
+    """
+    def __init__(self, path=LOG_FILE):
+        self.path = path
+        self.pid = None
+        self.lock = threading.Lock()
+
+    def _start(self):
+        self.pid = os.getpid()
+        self.t0 = time.monotonic()
+        self.q = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self.thread.start()
+        # Worker processes leave through os._exit(), which skips atexit but runs these
+        mp_util.Finalize(self, self.close, exitpriority=100)
+
+    def write(self, msg, **fields):
+        if self.pid != os.getpid():   # first use, or a forked child without the writer thread
+            with self.lock:
+                if self.pid != os.getpid():
+                    self._start()
+        self.q.put({
+            "ts": datetime.utcnow().isoformat() + "Z",
+            "elapsed_s": round(time.monotonic() - self.t0, 6),
+            "pid": self.pid,
+            "thread": threading.current_thread().name,
+            "msg": msg,
+            **fields,
+        })
+
+    def _run(self):
+        with open(self.path, "ab", buffering=0) as f:
+            while True:
+                batch = [self.q.get()]
+                while True:
+                    try:
+                        batch.append(self.q.get_nowait())
+                    except queue.Empty:
+                        break
+                stop = None in batch
+                lines = [json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in batch if r is not None]
+                if lines:
+                    f.write("".join(lines).encode("utf-8"))
+                if stop:
+                    return
+
+    def close(self):
+        with self.lock:
+            if self.pid == os.getpid():
+                self.q.put(None)
+                self.thread.join()
+            self.pid = None
+
+_log = JsonLog()
+atexit.register(_log.close)
+
+def log_line(msg, **fields):
+    """Log msg with optional structured fields (e.g. duration_s=..., rows=...)."""
+    _log.write(msg, **fields)
+
+def close_log():
+    """Flush everything queued so far and close the log file."""
+    _log.close()
 
 def progress(msg):
     print(f"[.] {msg}")
 
 # ---- Manifest ----
-def build_manifest(meta, outputs, all_rows, errors):
+def build_manifest(meta, outputs, counts, errors, acquisition=None, delta=None, performance=None, filters=None,
+                   sources=None):
     return {
         "metadata": meta,
-        "outputs": {str(f): sha256_file(f) for f in outputs},
-        "counts": {r["artifact"]: sum(1 for rr in all_rows if rr["artifact"]==r["artifact"]) for r in all_rows},
+        "outputs": {str(f): h for f, h in outputs.items()},
+        "counts": counts,
+        "acquisition": acquisition or {},
+        "sources": sources or {},
+        "delta": delta,
+        "filters": filters or None,
+        "performance": performance,
         "errors": errors
     }
 
@@ -60,8 +278,8 @@ def sign_manifest(path):
         log_line(f"Failed to sign manifest: {e}")
 
 # ---- File copy with VSS fallback ----
-def copy_with_vss(path: Path) -> Path:
-    shadow_path = Path(tempfile.gettempdir()) / f"copy_{os.getpid()}_{path.name}"
+def copy_with_vss(path: Path, dest: Path = None, sources=None) -> Path:
+    shadow_path = dest or Path(tempfile.gettempdir()) / f"copy_{os.getpid()}_{threading.get_ident()}_{path.name}"
     try:
         output = subprocess.check_output(["vssadmin", "list", "shadows"], text=True, stderr=subprocess.DEVNULL)
         for line in output.splitlines():
@@ -69,125 +287,176 @@ def copy_with_vss(path: Path) -> Path:
                 vol = line.split(":",1)[1].strip()
                 candidate = Path(vol) / str(path).lstrip("\\")
                 if candidate.exists():
-                    shutil.copy2(candidate, shadow_path)
+                    digest = copy_hashed(candidate, shadow_path)
+                    if sources is not None:
+                        sources.add(path, digest, method="vss")
                     return shadow_path
     except Exception as e:
         log_line(f"VSS fallback failed for {path}: {e}")
     return None
 
-def safe_copy(path: Path) -> Path:
+def safe_copy(path: Path, dest: Path = None, sources=None) -> Path:
+    """Copy path to dest (default: a temp file); the copy is hashed into sources (a SourceHashes)."""
     if not path.exists():
         return None
-    tmp = Path(tempfile.gettempdir()) / f"artifact_{os.getpid()}_{path.name}"
+    # Unique per thread: parallel jobs may copy the same source at once
+    tmp = dest or Path(tempfile.gettempdir()) / f"artifact_{os.getpid()}_{threading.get_ident()}_{path.name}"
     try:
-        shutil.copy2(path, tmp)
+        key = stat_key(path)
+        digest = copy_hashed(path, tmp)
+        if sources is not None:
+            sources.add(path, digest, key)
         return tmp
     except PermissionError:
         log_line(f"Permission denied copying {path}, trying VSS")
         if sys.platform.startswith("win"):
-            vss = copy_with_vss(path)
+            vss = copy_with_vss(path, dest, sources)
             if vss: return vss
     except Exception as e:
         log_line(f"Error copying {path}: {e}")
     return None
 
-# ---- User home discovery ----
-def find_all_user_homes():
-    homes = [Path.home()]
-    plat = sys.platform
-    if plat.startswith("win"):
-        base = Path("C:/Users")
-    elif plat == "darwin":
-        base = Path("/Users")
-    else:
-        base = Path("/home")
-    if base.exists():
-        homes = [p for p in base.iterdir() if p.is_dir()]
-    return homes
+# ---- Direct read-only access ----
+MMAP_SIZE = 256 * 1024 * 1024
 
-# ---- Browser profile discovery ----
-def find_browsers():
-    found = {}
-    for home in find_all_user_homes():
-        plat = sys.platform
+def open_immutable(path: Path):
+    """
+    Open a database in place through a read-only, immutable URI (no temp copy).
+    Returns None when the file is missing, locked, or has a non-empty -wal/-journal
+    that an immutable open would ignore; callers then fall back to a copy.
+    """
+    if not path.exists():
+        return None
+    for suffix in SnapshotCache.SIDECARS:
+        side = path.with_name(path.name + suffix)
+        if side.exists() and side.stat().st_size:
+            log_line(f"{side} is not empty, not opening {path} directly")
+            return None
+    try:
+        con = sqlite3.connect(f"{path.absolute().as_uri()}?mode=ro&immutable=1", uri=True)
+        con.execute("SELECT count(*) FROM sqlite_master").fetchone()
+        return tune_connection(con)
+    except (sqlite3.Error, OSError) as e:
+        log_line(f"Direct open of {path} failed ({e}), falling back to copy")
+        return None
 
-        def add(name, path):
-            try:
-                if path.exists():
-                    found.setdefault(name, []).append(path)
-            except PermissionError:
-                log_line(f"[ACCESS DENIED] Could not access {path} (user={home.name})")
-            except Exception as e:
-                log_line(f"[ERROR] Failed to check {path}: {e}")
+# ---- Streaming SQL reads ----
+FETCH_BATCH = 5000
 
-        try:
-            if plat.startswith("win"):
-                base_local = home / "AppData/Local"
-                base_roam  = home / "AppData/Roaming"
+def tune_connection(con):
+    """
+    Read-only scan settings: no writes, large page cache, mmap. temp_store is
+    left at its default, so temp b-trees (sorts, DISTINCT) spill to disk
+    instead of growing the process.
+    """
+    con.execute("PRAGMA query_only=ON")
+    con.execute("PRAGMA cache_size=-65536")
+    con.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+    return con
 
-                # Chrome: all profiles
-                chrome_base = base_local / "Google/Chrome/User Data"
-                try:
-                    if chrome_base.exists():
-                        for prof in chrome_base.glob("*/History"):
-                            add("chrome", prof)
-                except PermissionError:
-                    log_line(f"[ACCESS DENIED] Cannot list Chrome profiles for {home}")
-
-                # Edge: all profiles
-                edge_base = base_local / "Microsoft/Edge/User Data"
-                try:
-                    if edge_base.exists():
-                        for prof in edge_base.glob("*/History"):
-                            add("edge", prof)
-                except PermissionError:
-                    log_line(f"[ACCESS DENIED] Cannot list Edge profiles for {home}")
+def where(conditions):
+    """Join the non-empty conditions into a WHERE clause ("" when there are none)."""
+    conditions = [c for c in conditions if c]
+    return f" WHERE {' AND '.join(conditions)}" if conditions else ""
 
-                # Firefox
-                add("firefox", base_roam / "Mozilla/Firefox/Profiles")
+def extra(*tokens):
+    """Space-separated extra field from the non-empty tokens."""
+    return " ".join(t for t in tokens if t)
 
-            elif plat == "darwin":
-                chrome_base = home / "Library/Application Support/Google/Chrome"
-                try:
-                    if chrome_base.exists():
-                        for prof in chrome_base.glob("*/History"):
-                            add("chrome", prof)
-                except PermissionError:
-                    log_line(f"[ACCESS DENIED] Cannot list Chrome profiles for {home}")
+def query(con, sql, params=(), batch=FETCH_BATCH):
+    """Yield result rows in fetchmany() batches instead of materializing them with fetchall()."""
+    cur = con.cursor()
+    cur.arraysize = batch
+    cur.execute(sql, params)
+    while True:
+        rows = cur.fetchmany()
+        if not rows:
+            break
+        yield from rows
 
-                edge_base = home / "Library/Application Support/Microsoft Edge"
-                try:
-                    if edge_base.exists():
-                        for prof in edge_base.glob("*/History"):
-                            add("edge", prof)
-                except PermissionError:
-                    log_line(f"[ACCESS DENIED] Cannot list Edge profiles for {home}")
+# ---- Per-run snapshot cache ----
+class SnapshotCache:
+    """
+    Copies each source file once per run, together with its -wal/-journal
+    sidecars so SQLite still sees pages not yet checkpointed, and hands every
+    caller the same snapshot. Copies are hashed into sources (a SourceHashes)
+    on the way. cleanup() deletes all snapshots.
+    """
+    SIDECARS = ("-wal", "-journal")
 
-                add("safari", home / "Library/Safari/History.db")
-                add("firefox", home / "Library/Application Support/Firefox/Profiles")
+    def __init__(self, sources=None):
+        self.sources = sources
+        self.root = None
+        self.snapshots = {}
+        self.locks = {}
+        self.slots = {}   # key -> its own directory under root, allocated with its lock
+        self.lock = threading.Lock()
 
-            else:  # Linux
-                chrome_base = home / ".config/google-chrome"
-                try:
-                    if chrome_base.exists():
-                        for prof in chrome_base.glob("*/History"):
-                            add("chrome", prof)
-                except PermissionError:
-                    log_line(f"[ACCESS DENIED] Cannot list Chrome profiles for {home}")
+    def get(self, path: Path) -> Path:
+        key = str(path)
+        with self.lock:
+            if key in self.snapshots:
+                return self.snapshots[key]
+            if self.root is None:
+                self.root = Path(tempfile.mkdtemp(prefix=f"frostveil_{os.getpid()}_"))
+            if key not in self.locks:
+                self.locks[key] = threading.Lock()
+                self.slots[key] = self.root / str(len(self.locks))
+            lock, slot = self.locks[key], self.slots[key]
+        # Per-source lock: other sources keep copying while this one is in flight
+        with lock:
+            if key not in self.snapshots:
+                self.snapshots[key] = self._copy(path, slot)
+        return self.snapshots[key]
 
-                edge_base = home / ".config/microsoft-edge"
-                try:
-                    if edge_base.exists():
-                        for prof in edge_base.glob("*/History"):
-                            add("edge", prof)
-                except PermissionError:
-                    log_line(f"[ACCESS DENIED] Cannot list Edge profiles for {home}")
+    def _copy(self, path: Path, slot: Path) -> Path:
+        if not path.exists():
+            return None
+        slot.mkdir()
+        t0 = time.perf_counter()
+        snap = safe_copy(path, slot / path.name, self.sources)
+        if snap:
+            copied = snap.stat().st_size
+            for suffix in self.SIDECARS:
+                side = path.with_name(path.name + suffix)
+                if side.exists() and safe_copy(side, slot / side.name, self.sources):
+                    copied += side.stat().st_size
+            profiling.add_copied(copied)
+            log_line(f"Snapshot of {path} taken at {snap}", source=str(path),
+                     duration_s=round(time.perf_counter() - t0, 6))
+        return snap
 
-                add("firefox", home / ".mozilla/firefox")
+    def cleanup(self):
+        with self.lock:
+            if self.root is not None:
+                shutil.rmtree(self.root, ignore_errors=True)
+            self.root = None
+            self.snapshots, self.locks, self.slots = {}, {}, {}
 
-        except PermissionError:
-            log_line(f"[ACCESS DENIED] Skipping entire home directory {home}")
-        except Exception as e:
-            log_line(f"[ERROR] Unexpected error scanning {home}: {e}")
+# ---- User home discovery ----
+def host_os():
+    plat = sys.platform
+    return "windows" if plat.startswith("win") else "darwin" if plat == "darwin" else "linux"
 
-    return found
+def find_all_user_homes(root=None):
+    """
+    User homes on the live host, or, given root (a mounted evidence image),
+    every home under it: root/Users/* (Windows, macOS), root/home/* and root/root.
+    """
+    if root is None:
+        homes = [Path.home()]
+        base = {"windows": Path("C:/Users"), "darwin": Path("/Users")}.get(host_os(), Path("/home"))
+        if base.exists():
+            homes = [p for p in base.iterdir() if p.is_dir()]
+        return homes
+    root = Path(root)
+    homes = []
+    for base in (root / "Users", root / "home"):
+        try:
+            if base.is_dir():
+                homes += sorted(p for p in base.iterdir() if p.is_dir())
+        except PermissionError:
+            log_line(f"[ACCESS DENIED] Cannot list user homes in {base}")
+    if (root / "root").is_dir():
+        homes.append(root / "root")
+    return homes
@@ -0,0 +1,362 @@
+import io, csv, json, queue, sqlite3, heapq, shutil, tempfile, multiprocessing
+from operator import attrgetter
+from pathlib import Path
+from . import utils, columnar, compress as compression
+
+# Streaming output sinks: rows are written as they arrive, nothing is held
+# beyond the current insert batch. Rows are utils.Row tuples; the run
+# metadata is prepended here so every output keeps its full column set.
+# Text outputs are hashed while they are written (see utils.HashingFile).
+# compress is False, True (gzip defaults) or a compress.Options.
+
+BUFFER = 1024 * 1024
+
+def open_out(path, compress=False):
+    """Return (text handle, byte stream under it); the byte stream hashes what reaches disk."""
+    tee = utils.HashingFile(path)
+    raw = io.BufferedWriter(tee, buffer_size=BUFFER)
+    stream = raw
+    if compress:
+        stream = compression.ParallelWriter(raw, compress if isinstance(compress, compression.Options) else None)
+    return io.TextIOWrapper(stream, encoding="utf-8"), raw
+
+def json_encoder(meta, columns, indent=None, separators=None):
+    """
+    row -> JSON object text with the meta keys first, byte-identical to
+    encoding the merged dict. The constant meta part is encoded once. Rows are
+    flat, so indented objects are laid out here around per-value encoding
+    (json only uses its C encoder without indent).
+    """
+    encode = json.JSONEncoder(ensure_ascii=False, separators=separators).encode
+    columns = tuple(columns)
+    if indent is None:
+        if not meta:
+            return lambda row: encode(dict(zip(columns, row)))
+        head = encode(meta)[:-1] + (separators or (", ", ": "))[0]   # '{"a": 1, ' + '"b": 2}'[1:]
+        return lambda row: head + encode(dict(zip(columns, row)))[1:]
+    item_sep, key_sep = separators or (",", ": ")
+    pad = "\n" + " " * indent
+    join = item_sep + pad
+    keys = [encode(k) + key_sep for k in columns]
+    head = "{" + pad + "".join(encode(k) + key_sep + encode(v) + join for k, v in meta.items())
+    return lambda row: head + join.join([k + encode(v) for k, v in zip(keys, row)]) + "\n}"
+
+class Sink:
+    digest = None
+
+    def __init__(self, path, meta, compress=False, columns=utils.COLUMNS):
+        self.path = Path(path)
+        self.columns = tuple(columns)
+        self.fields = list(meta) + list(columns)
+        self.prefix = tuple(meta.values())
+
+    def open(self, path, compress=False):
+        self.f, self.raw = open_out(path, compress)
+        return self.f
+
+    def close(self):
+        self.f.close()
+        # The compressor leaves raw open; closing it flushes the last bytes through the hash
+        self.raw.close()
+        self.digest = self.raw.raw.hexdigest()
+
+class CsvSink(Sink):
+    def __init__(self, path, meta, compress=False, columns=utils.COLUMNS):
+        super().__init__(path, meta, compress, columns)
+        self.w = csv.writer(self.open(path, compress))
+        self.w.writerow(self.fields)
+
+    def write(self, row):
+        self.w.writerow(self.prefix + row)
+
+class JsonSink(Sink):
+    """
+    Writes a JSON array one element at a time: the same bytes as
+    json.dump(rows, indent=2), or with compact, one unindented element per line.
+    """
+    def __init__(self, path, meta, compress=False, columns=utils.COLUMNS, compact=False):
+        super().__init__(path, meta, compress, columns)
+        self.open(path, compress)
+        self.compact = compact
+        self.encode = json_encoder(meta, columns, separators=(",", ":")) if compact else json_encoder(meta, columns, indent=2)
+        self.first = True
+
+    def write(self, row):
+        if self.compact:
+            self.f.write(("[\n" if self.first else ",\n") + self.encode(row))
+        else:
+            self.f.write(("[\n  " if self.first else ",\n  ") + self.encode(row).replace("\n", "\n  "))
+        self.first = False
+
+    def close(self):
+        self.f.write("[]" if self.first else "\n]")
+        super().close()
+
+class JsonlSink(Sink):
+    def __init__(self, path, meta, compress=False, columns=utils.COLUMNS):
+        super().__init__(path, meta, compress, columns)
+        self.open(path, compress)
+        self.encode = json_encoder(meta, columns)
+
+    def write(self, row):
+        self.f.write(self.encode(row) + "\n")
+
+class SqliteSink(Sink):
+    """
+    Bulk loader: typed table, one transaction with journaling and fsync off for
+    the load, chunked inserts, indexes built once the data is in.
+    """
+    BATCH = 10000
+    TYPES = {"visit_count": "INTEGER"}
+    INDEXES = {"data_artifact_browser_time": "artifact, browser, visit_time_utc", "data_url": "url",
+               "data_url_id": "url_id"}   # each built only if the table has its columns
+
+    def __init__(self, path, meta, compress=False, columns=utils.COLUMNS):
+        super().__init__(path, meta, compress, columns)
+        for p in (self.path, self.path.with_name(self.path.name + "-journal")):
+            p.unlink(missing_ok=True)
+        self.conn = sqlite3.connect(path, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=OFF")
+        self.conn.execute("PRAGMA synchronous=OFF")
+        cols = ", ".join(f"{c} {self.TYPES.get(c, 'TEXT')}" for c in self.fields)
+        self.conn.execute(f"CREATE TABLE data ({cols})")
+        self.conn.execute("BEGIN")
+        self.insert = f"INSERT INTO data VALUES ({','.join(['?']*len(self.fields))})"
+        self.batch = []
+
+    def write(self, row):
+        self.batch.append(self.prefix + row)
+        if len(self.batch) >= self.BATCH:
+            self.flush()
+
+    def flush(self):
+        if self.batch:
+            self.conn.executemany(self.insert, self.batch)
+            self.batch = []
+
+    def close(self):
+        self.flush()
+        for name, cols in self.INDEXES.items():
+            if set(cols.split(", ")) <= set(self.fields):
+                self.conn.execute(f"CREATE INDEX {name} ON data ({cols})")
+        self.conn.execute("COMMIT")
+        self.conn.execute("PRAGMA journal_mode=DELETE")
+        self.conn.close()
+        # SQLite owns the file I/O, so this one output is hashed after the fact
+        self.digest = utils.sha256_file(self.path)
+
+SINKS = {"csv": CsvSink, "json": JsonSink, "jsonl": JsonlSink, "sqlite": SqliteSink, "columnar": columnar.ColumnarSink}
+
+TIME_KEY = attrgetter("visit_time_utc")
+
+class TimelineSink:
+    """
+    Unified timeline by external merge sort. Rows are buffered, spilled to
+    sorted temp files whenever the buffer fills, and k-way merged with
+    heapq.merge on close. Memory stays at one buffer however many events
+    there are. start/end bound the window as [start, end).
+    """
+    BUFFER = 200000   # rows held before spilling a run
+    FANIN = 64        # runs merged at once (open file handles)
+
+    def __init__(self, path, meta, fmt="json", start=None, end=None):
+        self.path, self.meta, self.fmt = Path(path), meta, fmt
+        self.start, self.end = start, end
+        self.buf, self.runs, self.tmpdir, self.nspilled = [], [], None, 0
+        self.digest = None
+
+    def write(self, row):
+        t = row.visit_time_utc
+        if not t or (self.start and t < self.start) or (self.end and t >= self.end):
+            return
+        self.buf.append(row)
+        if len(self.buf) >= self.BUFFER:
+            self.buf.sort(key=TIME_KEY)
+            self.runs.append(self.spill(self.buf))
+            self.buf = []
+
+    def spill(self, rows):
+        if self.tmpdir is None:
+            self.tmpdir = Path(tempfile.mkdtemp(prefix="frostveil_timeline_"))
+        self.nspilled += 1
+        run = self.tmpdir / f"run{self.nspilled}.jsonl"
+        with open(run, "w", encoding="utf-8") as f:
+            for r in rows:
+                f.write(json.dumps(r, ensure_ascii=False) + "\n")
+        return run
+
+    @staticmethod
+    def read(run):
+        with open(run, encoding="utf-8") as f:
+            for line in f:
+                yield utils.Row(*json.loads(line))
+
+    def merged(self):
+        self.buf.sort(key=TIME_KEY)
+        if not self.runs:
+            return self.buf
+        if self.buf:
+            self.runs.append(self.spill(self.buf))
+            self.buf = []
+        # Multi-pass merge so very long timelines never hold too many files open
+        while len(self.runs) > self.FANIN:
+            group, self.runs = self.runs[:self.FANIN], self.runs[self.FANIN:]
+            self.runs.insert(0, self.spill(heapq.merge(*map(self.read, group), key=TIME_KEY)))
+            for run in group:
+                run.unlink()
+        return heapq.merge(*map(self.read, self.runs), key=TIME_KEY)
+
+    def close(self):
+        try:
+            sink = SINKS[self.fmt](self.path, self.meta)
+            for r in self.merged():
+                sink.write(r)
+            sink.close()
+            self.digest = sink.digest
+        finally:
+            self.buf, self.runs = [], []
+            if self.tmpdir is not None:
+                shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+def sibling(out, name):
+    """Output path next to out with a name suffix: artifacts.csv -> artifacts_<name>.csv."""
+    stem, suf = Path(out).stem, Path(out).suffix
+    return f"{stem}_{name}{suf}"
+
+# ---- Parallel group writing ----
+def _group_worker(fmt, meta, compress, options, inbox, results):
+    """Worker process: owns the sinks of the groups assigned to it and writes their row batches."""
+    sinks = {}
+    try:
+        for msg in iter(inbox.get, None):
+            if msg[0] == "open":
+                sinks[msg[1]] = SINKS[fmt](msg[2], meta, compress, **options)
+            else:
+                write = sinks[msg[1]].write
+                for row in msg[2]:
+                    write(row)
+        digests = {}
+        for s in sinks.values():
+            s.close()
+            digests[str(s.path)] = s.digest
+        results.put((digests, None))
+    except Exception as e:
+        results.put(({}, f"{type(e).__name__}: {e}"))
+
+class GroupWriters:
+    """
+    Writes independent output groups concurrently: each group's sink lives in
+    one of `workers` processes (encoding holds the GIL, so threads would not
+    overlap) and rows reach it in batches over a bounded queue. Every group is
+    still written by a single sink in arrival order, so the outputs are the
+    same as a sequential write.
+    """
+    BATCH = 2000   # rows per message
+    DEPTH = 16     # messages queued per worker before the producer waits
+
+    def __init__(self, fmt, meta, compress, options, workers):
+        ctx = multiprocessing.get_context("spawn")   # the parent may be running extraction threads
+        self.inboxes = [ctx.Queue(maxsize=self.DEPTH) for _ in range(workers)]
+        self.results = ctx.Queue()
+        self.procs = [ctx.Process(target=_group_worker, args=(fmt, meta, compress, options, q, self.results),
+                                  name=f"writer-{i}", daemon=True) for i, q in enumerate(self.inboxes)]
+        for proc in self.procs:
+            proc.start()
+        self.assigned, self.batches, self.paths = {}, {}, {}
+
+    def _send(self, i, msg):
+        while True:
+            try:
+                self.inboxes[i].put(msg, timeout=1)
+                return
+            except queue.Full:
+                if not self.procs[i].is_alive():
+                    raise RuntimeError(f"output writer process {i} exited")
+
+    def write(self, gname, outname, row):
+        batch = self.batches.get(gname)
+        if batch is None:
+            i = self.assigned[gname] = len(self.assigned) % len(self.inboxes)   # round-robin, in order of first row
+            self.paths[gname] = str(Path(outname))
+            self._send(i, ("open", gname, outname))
+            batch = self.batches[gname] = []
+        batch.append(tuple(row))
+        if len(batch) >= self.BATCH:
+            self._send(self.assigned[gname], ("rows", gname, batch))
+            self.batches[gname] = []
+
+    def close(self):
+        """{output path: sha256} of every group, once all workers have finished."""
+        try:
+            for gname, batch in self.batches.items():
+                if batch:
+                    self._send(self.assigned[gname], ("rows", gname, batch))
+            for i in range(len(self.inboxes)):
+                self._send(i, None)
+            digests, errors = {}, []
+            for _ in self.procs:
+                done, error = self.results.get()
+                digests.update(done)
+                if error:
+                    errors.append(error)
+            if errors:
+                raise RuntimeError(f"writing outputs failed: {'; '.join(errors)}")
+            return {Path(path): digests[path] for path in self.paths.values()}   # in order of first row
+        finally:
+            for proc in self.procs:
+                proc.join(timeout=5)
+                if proc.is_alive():
+                    proc.kill()
+
+class StreamWriter:
+    """
+    Routes rows to per-group sinks (per browser and/or artifact), opening each
+    output lazily on its first row, and keeps per-artifact counts as it goes.
+    With workers > 1 and a split output, groups are written concurrently by
+    GroupWriters. options are extra sink arguments (e.g. compact for json).
+    close() returns {output path: sha256}.
+    """
+    def __init__(self, fmt, out, meta, compress=False, split_artifacts=False, per_browser=False, options=None,
+                 workers=1):
+        self.fmt, self.options = fmt, dict(options or {})
+        self.sink_cls = SINKS[fmt]
+        self.out, self.meta, self.compress = out, meta, compress
+        self.split_artifacts, self.per_browser = split_artifacts, per_browser
+        self.sinks, self.counts = {}, {}
+        self.parallel = None
+        if workers > 1 and (split_artifacts or per_browser):
+            self.parallel = GroupWriters(fmt, meta, compress, self.options, workers)
+
+    def group(self, row):
+        key = []
+        if self.per_browser:
+            key.append(row.browser)
+        if self.split_artifacts:
+            key.append(row.artifact)
+        return "_".join(key) if key else "all"
+
+    def outname(self, gname):
+        return self.out if gname == "all" else sibling(self.out, gname)
+
+    def sink(self, gname):
+        s = self.sinks[gname] = self.sink_cls(self.outname(gname), self.meta, self.compress, **self.options)
+        return s
+
+    def write(self, row):
+        gname = self.group(row)
+        if self.parallel:
+            self.parallel.write(gname, self.outname(gname), row)
+        else:
+            s = self.sinks.get(gname) or self.sink(gname)
+            s.write(row)
+        self.counts[row.artifact] = self.counts.get(row.artifact, 0) + 1
+
+    def close(self):
+        if self.parallel:
+            return self.parallel.close()
+        outputs = {}
+        for gname, s in self.sinks.items():
+            s.close()
+            outputs[s.path] = s.digest
+        self.sinks = {}
+        return outputs
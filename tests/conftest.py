@@ -0,0 +1,27 @@
+import json, subprocess, sys
+from pathlib import Path
+import pytest
+
+REPO = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO))
+
+from benchmarks import fixtures
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """Keep the run log (utils.LOG_FILE, relative to the working directory) out of the repo."""
+    monkeypatch.chdir(tmp_path)
+
+@pytest.fixture(scope="session")
+def evidence(tmp_path_factory):
+    """Small synthetic evidence root (one Chrome and one Firefox profile)."""
+    return fixtures.generate(tmp_path_factory.mktemp("evidence"), rows=2000)
+
+@pytest.fixture
+def frostveil(tmp_path):
+    """Run main.py in a fresh output directory; returns the parsed manifest."""
+    def run(*args):
+        subprocess.run([sys.executable, str(REPO / "main.py"), *map(str, args)], cwd=tmp_path, check=True,
+                       capture_output=True, text=True)
+        return json.loads((tmp_path / "manifest.json").read_text(encoding="utf-8"))
+    return run
@@ -0,0 +1,28 @@
+import json
+from modules import columnar, utils
+
+def test_fixture_round_trip(evidence, frostveil, tmp_path):
+    # the same run as .fvc and as JSON lines decodes to the same records
+    frostveil("--evidence-root", evidence, "--format", "jsonl", "--out", "rows.jsonl")
+    frostveil("--evidence-root", evidence, "--format", "columnar", "--out", "rows.fvc")
+    with open(tmp_path / "rows.jsonl", encoding="utf-8") as f:
+        expected = [json.loads(line) for line in f]
+    # metadata (acquired_utc) differs per run
+    strip = lambda r: {k: v for k, v in r.items() if k in utils.COLUMNS}
+    assert expected and [strip(r) for r in columnar.iter_rows(tmp_path / "rows.fvc")] == [strip(r) for r in expected]
+
+def test_row_groups_nulls_and_projection(tmp_path, monkeypatch):
+    monkeypatch.setattr(columnar, "ROW_GROUP", 3)
+    meta = {"hostname": "h", "acquired_utc": "2024-01-01T00:00:00Z"}
+    rows = [utils.Row("chrome", "history", "/p", f"https://é.example/{i}", f"t{i}", i, f"2024-01-0{i + 1}T00:00:0{i}.{i:06d}" if i else "2024-01-01T00:00:00", "")
+            for i in range(7)]
+    rows += [utils.Row("firefox", "cookie", "/q", ".host.example", None, None, None, "value=x"),
+             utils.Row("firefox", "extension", "/q", "no-scheme", "", None, "1601-01-01T00:00:00", None)]
+    sink = columnar.ColumnarSink(tmp_path / "t.fvc", meta)
+    for r in rows:
+        sink.write(r)
+    sink.close()
+    assert list(columnar.iter_rows(tmp_path / "t.fvc")) == [dict(meta, **r._asdict()) for r in rows]
+    assert columnar.read_columns(tmp_path / "t.fvc", ["visit_count", "hostname"]) == {
+        "visit_count": [r.visit_count for r in rows], "hostname": ["h"] * len(rows)}
+    assert len(columnar.read_footer(open(tmp_path / "t.fvc", "rb"))["row_groups"]) == 3
@@ -0,0 +1,23 @@
+import json, sqlite3
+from benchmarks import fixtures
+
+def read_jsonl(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+def test_delta_rows_are_tagged(frostveil, tmp_path):
+    root = fixtures.generate(tmp_path / "evidence", rows=500)
+    first = frostveil("--evidence-root", root, "--format", "jsonl", "--out", "full.jsonl", "--since-state", "state.json")
+    assert first["delta"] == {"baseline": None, "rows": "full"}
+    assert not any("delta=" in r["extra"] for r in read_jsonl(tmp_path / "full.jsonl"))
+
+    con = sqlite3.connect(root / "home/bench/.config/google-chrome/Default/History")
+    con.execute("UPDATE urls SET last_visit_time = last_visit_time + 86400000000 WHERE id = 1")
+    con.execute("INSERT INTO urls(url, title, visit_count, last_visit_time) VALUES ('https://new.example/', 'new', 1, 13350000000000000)")
+    con.commit()
+    con.close()
+    second = frostveil("--evidence-root", root, "--format", "jsonl", "--out", "delta.jsonl", "--since-state", "state.json")
+    assert second["delta"]["baseline"]["acquired_utc"] and second["delta"]["rows"] == "new or updated since baseline"
+    history = {r["url"]: r["extra"] for r in read_jsonl(tmp_path / "delta.jsonl") if r["artifact"] == "history"}
+    assert history["https://new.example/"] == "delta=new"
+    assert len(history) == 2 and "delta=updated" in history.values()
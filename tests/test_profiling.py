@@ -0,0 +1,8 @@
+def test_profile_with_workers(evidence, frostveil, tmp_path):
+    # per-thread profilers must not cost rows (cProfile is process-wide from 3.12)
+    serial = frostveil("--evidence-root", evidence, "--out", "serial.csv")
+    manifest = frostveil("--evidence-root", evidence, "--profile", "--workers", "2")
+    assert manifest["counts"] == serial["counts"] and manifest["counts"]
+    assert manifest["errors"] == []
+    assert (tmp_path / "profile.pstats").stat().st_size
+    assert "cProfile" in (tmp_path / "profile.txt").read_text(encoding="utf-8")
@@ -0,0 +1,24 @@
+import sqlite3
+from benchmarks import fixtures
+from modules import context, discovery, searches, utils
+
+def test_search_time_is_first_visit(tmp_path):
+    root = fixtures.generate(tmp_path / "evidence", rows=200)
+    con = sqlite3.connect(root / "home/bench/.config/google-chrome/Default/History")
+    (first, url_a), (url_b,) = (con.execute("SELECT last_visit_time, url_id FROM keyword_search_terms JOIN urls ON urls.id = url_id").fetchone(),
+                                con.execute("SELECT url_id FROM keyword_search_terms LIMIT 1 OFFSET 1").fetchone())
+    # the results page of one search revisited a day later; the visits of another expired
+    con.execute("INSERT INTO visits(url, visit_time, transition) VALUES (?, ?, 805306368)", (url_a, first + 86400000000))
+    con.execute("UPDATE urls SET last_visit_time = ? WHERE id = ?", (first + 86400000000, url_a))
+    con.execute("DELETE FROM visits WHERE url = ?", (url_b,))
+    con.commit()
+    con.close()
+    ctx = context.RunContext(utils.get_metadata())
+    try:
+        profile = next(p for p in discovery.inventory(root)[0] if p.browser == "chrome")
+        rows = list(searches.extract(profile, ctx))
+    finally:
+        ctx.close()
+    assert rows[0].visit_time_utc == utils.utc_from_us(first) and rows[0].extra == ""
+    assert rows[1].visit_time_utc and rows[1].extra == "time=url_last_visit"
+    assert all(r.extra == "" for r in rows[2:])
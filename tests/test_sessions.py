@@ -0,0 +1,35 @@
+import json, random
+import pytest
+from benchmarks import fixtures
+from modules import sessions
+
+def test_known_lz4_block():
+    # literals "abc", then a 9-byte match at offset 3 (overlapping), then an empty last sequence
+    block = bytes([0x35]) + b"abc" + bytes([3, 0, 0x00])
+    assert sessions.lz4_block_decompress(block, 12) == b"abc" * 4
+    assert sessions.mozlz4_decompress(b"mozLz40\0" + (12).to_bytes(4, "little") + block) == b"abc" * 4
+
+def test_mozlz4_round_trip():
+    rng = random.Random(1)
+    for data in [b"", b"x", bytes(rng.randrange(4) for _ in range(70000)), b"\0" * 70000 + b"end of the data!!",
+                 json.dumps({"windows": [{"tabs": [{"entries": [{"url": f"https://e.com/{i}"}]} for i in range(500)]}]}).encode()]:
+        assert bytes(sessions.mozlz4_decompress(fixtures.mozlz4(data))) == data
+        assert bytes(sessions.lz4_block_decompress(fixtures.lz4_block(data), len(data))) == data
+
+def test_corrupt_lz4_block():
+    with pytest.raises(ValueError):   # match offset reaches before the start of the output
+        sessions.lz4_block_decompress(bytes([0x10]) + b"a" + bytes([9, 0]), 10)
+
+def test_snss_latest_navigation_per_tab():
+    ts = fixtures.WEBKIT_BASE
+    data = fixtures.snss([
+        (1, b"\0" * 8),
+        (6, fixtures.snss_navigation(1, 0, "https://a.example/", "Ä title", ts)),
+        (6, fixtures.snss_navigation(1, 0, "https://a.example/x", "updated", ts + 1)),
+        (6, fixtures.snss_navigation(2, 1, "https://b.example/", "B", ts + 2)),
+        (6, fixtures.pickle(("i", 3), ("i", 0), ("s", "https://old.example/"), ("w", "old"))),   # no timestamp
+    ]) + b"\x40\x00trunc"   # truncated tail of a file still being written
+    navs = sorted(sessions.snss_navigations(data, "session"))
+    assert navs == [(1, 0, "https://a.example/x", "updated", ts + 1), (2, 1, "https://b.example/", "B", ts + 2),
+                    (3, 0, "https://old.example/", "old", None)]
+    assert list(sessions.snss_navigations(data, "tabs")) == []